@@ -3,756 +3,1050 @@ API route handlers for the video processing application.
 This module registers all HTTP endpoints with the Flask application.
 """
 
-from flask import request, jsonify, send_file, Response, stream_with_context
+from flask import Blueprint, current_app, request, jsonify, send_file, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import RequestedRangeNotSatisfiable, RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
 import os
-import uuid
-import threading
+import base64
+import gzip
+import logging
+import functools
+import tempfile
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 import json
 import cv2
 import numpy as np
+from video_processor import apply_filter, open_video_capture
+
+# orjson is optional - faster serialization for the SSE stream and job status
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# Available filters, serialized once at import
+FILTERS = [
+    {
+        "id": "grayscale",
+        "name": "Grayscale",
+        "description": "Convert to black and white"
+    },
+    {
+        "id": "blur",
+        "name": "Blur",
+        "description": "Apply Gaussian blur effect"
+    },
+    {
+        "id": "sepia",
+        "name": "Sepia",
+        "description": "Apply vintage sepia tone"
+    }
+]
+FILTERS_JSON = json.dumps({"filters": FILTERS})
+FILTERS_JSON_GZ = gzip.compress(FILTERS_JSON.encode('utf-8'), 9)
+
+# Browser cache lifetimes (seconds) for static JSON and the sample video
+FILTERS_MAX_AGE = 86400
+MODEL_INFO_MAX_AGE = 3600
+SAMPLE_VIDEO_MAX_AGE = 3600
+
+# Fixed error messages; their JSON bodies are serialized once in register_routes
+ERROR_MESSAGES = {
+    'no_file': "No file part in request",
+    'no_selected_file': "No file selected",
+    'video_id_required': "video_id is required",
+    'queue_full': "Too many jobs queued, please try again later",
+    'job_not_found': "Job not found",
+    'job_finished': "Job already finished",
+    'no_first_frame': "Could not extract first frame from video",
+}
+
+# Seconds an idle SSE progress stream waits before sending a keepalive
+SSE_KEEPALIVE_INTERVAL = 15
+
+# Block size used when copying upload bodies to disk
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # 4MB
+
+# Number of decoded first frames kept for filter previews (JPEG encoded)
+FIRST_FRAME_CACHE_SIZE = 64
+FIRST_FRAME_JPEG_QUALITY = 95
+# Filter previews are thumbnails, so detection runs at a reduced input size
+# and the frame, mask and composites are all kept at thumbnail width
+FILTER_PREVIEW_IMGSZ = 320
+FILTER_PREVIEW_MAX_WIDTH = 640
+
+
+@functools.lru_cache(maxsize=FIRST_FRAME_CACHE_SIZE)
+def _read_first_frame_jpeg(video_path):
+    """
+    Decode the first frame of a video and return it JPEG encoded.
+
+    Uploaded videos are stored under unique names and never modified, so the
+    result can be cached by path. Frames are downscaled to
+    FILTER_PREVIEW_MAX_WIDTH and kept as JPEG bytes to keep the cache small.
+    Failures raise instead of returning, so they are never cached and a
+    retry reads the file again.
+
+    Args:
+        video_path: Path to the video file as a string
+
+    Returns:
+        tuple: (JPEG bytes, original (width, height) of the frame)
+
+    Raises:
+        ValueError: If the video could not be opened, decoded or encoded
+    """
+    cap = open_video_capture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+
+    if not ret or frame is None:
+        raise ValueError(f"Could not read first frame: {video_path}")
+
+    height, width = frame.shape[:2]
+    if width > FILTER_PREVIEW_MAX_WIDTH:
+        scale = FILTER_PREVIEW_MAX_WIDTH / width
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, FIRST_FRAME_JPEG_QUALITY])
+    if not ok:
+        raise ValueError(f"Could not encode first frame: {video_path}")
+    return buffer.tobytes(), (width, height)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes with orjson.
+
+    Pretty-printed output (debug mode jsonify) and loads() keep the default
+    stdlib behaviour; everything else goes through orjson's C encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+
+def _json_bytes(obj):
+    """Serialize obj to UTF-8 JSON bytes, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _sse_event(obj):
+    """Format obj as a Server-Sent Events data message"""
+    return b"data: " + _json_bytes(obj) + b"\n\n"
+
+
+def _static_json_response(body, body_gz, max_age):
+    """
+    Serve a fixed JSON body, using the precompressed copy if the client accepts gzip.
+
+    Args:
+        body: JSON body
+        body_gz: gzip-compressed body
+        max_age: Cache-Control max-age in seconds
+
+    Returns:
+        Flask Response
+    """
+    headers = {'Cache-Control': f'public, max-age={max_age}', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(body_gz, status=200, mimetype='application/json', headers=headers)
+    return Response(body, status=200, mimetype='application/json', headers=headers)
+
+
+def _save_upload_stream(stream, file_path, max_size):
+    """
+    Copy an upload stream to disk in large blocks.
+
+    The data is written to a temporary file next to the destination and moved
+    into place with os.replace once complete, so a partially written upload is
+    never visible under its final name.
+
+    Args:
+        stream: Readable binary stream (request body or multipart file stream)
+        file_path: Destination path
+        max_size: Maximum number of bytes to accept
+
+    Returns:
+        Number of bytes written, or None if the upload exceeded max_size
+    """
+    file_path = str(file_path)
+    tmp = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(file_path), prefix='.upload_', delete=False
+    )
+    written = 0
+    try:
+        with tmp:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_size:
+                    break
+                tmp.write(chunk)
+
+        if written > max_size:
+            os.remove(tmp.name)
+            return None
+
+        # NamedTemporaryFile creates 0600 files; match a regular file.save()
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, file_path)
+        return written
+    except Exception:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+        raise
+
+
+def _parse_multipart_upload(upload_folder, max_size, spooled):
+    """
+    Parse the current multipart request, spooling file parts to disk.
+
+    Each file part is written by the form parser directly into a temporary
+    file inside upload_folder, so it can later be moved into place with
+    os.replace instead of being copied out of Werkzeug's spooled tempfile.
+
+    Args:
+        upload_folder: Directory the uploads are stored in
+        max_size: Maximum request body size in bytes
+        spooled: List that every temporary file is appended to as it is
+            created, so the caller can clean up even if parsing fails
+
+    Returns:
+        MultiDict of FileStorage objects backed by the temporary files
+
+    Raises:
+        RequestEntityTooLarge: If the body exceeds max_size
+    """
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        tmp = tempfile.NamedTemporaryFile(dir=upload_folder, prefix='.upload_', delete=False)
+        spooled.append(tmp)
+        return tmp
+
+    _, _, files = parse_form_data(
+        request.environ,
+        stream_factory=stream_factory,
+        max_content_length=max_size,
+        silent=False
+    )
+    return files
+
+
+def _discard_uploads(spooled):
+    """Close and delete temporary files left by _parse_multipart_upload"""
+    for tmp in spooled:
+        tmp.close()
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+
+
+def _move_upload(file, file_path):
+    """
+    Move a spooled multipart file part to its final path.
+
+    Args:
+        file: FileStorage returned by _parse_multipart_upload
+        file_path: Destination path
+
+    Returns:
+        Size of the stored file in bytes
+    """
+    file.stream.close()
+    # NamedTemporaryFile creates 0600 files; match a regular file.save()
+    os.chmod(file.stream.name, 0o644)
+    os.replace(file.stream.name, file_path)
+    return os.stat(file_path).st_size
+
+
+# Routes are declared once at import; register_routes attaches them to an app
+bp = Blueprint('api', __name__)
+
+
+def _config():
+    """Route context stored on the app by register_routes"""
+    return current_app.extensions['video_config']
+
+
+def error_response(key, status):
+    """Return a pre-serialized JSON error response"""
+    return Response(_config().error_bodies[key], status=status, mimetype='application/json')
 
 
 def register_routes(app, config):
     """
     Register all API routes with the Flask app.
 
+    The routes live on a module-level blueprint built once at import; the
+    config and per-app state (job executor, serialized error bodies) are
+    stored in app.extensions['video_config'] for the handlers to read.
+
     Args:
         app: Flask application instance
         config: Dictionary containing configuration and helper functions
     """
-    # Extract config
-    logger = config['logger']
-    UPLOAD_FOLDER = config['UPLOAD_FOLDER']
-    PROCESSED_FOLDER = config['PROCESSED_FOLDER']
-    PREVIEW_FOLDER = config['PREVIEW_FOLDER']
-    ALLOWED_EXTENSIONS = config['ALLOWED_EXTENSIONS']
-    MAX_FILE_SIZE = config['MAX_FILE_SIZE']
-    get_processor = config['get_processor']
-    allowed_file = config['allowed_file']
-    create_job = config['create_job']
-    update_job_status = config['update_job_status']
-    get_job = config['get_job']
-    process_video_background = config['process_video_background']
-
-    @app.route("/hello-world", methods=["GET"])
-    def hello_world():
-        """Health check endpoint"""
-        try:
-            return jsonify({"Hello": "World"}), 200
-        except Exception as e:
-            logger.error(f"Error: {e}")
-            return jsonify({"error": str(e)}), 500
+    cfg = SimpleNamespace(**config)
 
-    @app.route("/sample.mp4", methods=["GET"])
-    def serve_sample_video():
-        """
-        Serve sample video for demo
+    if ORJSON_AVAILABLE:
+        app.json = ORJSONProvider(app)
 
-        Returns:
-            Sample video file or 404 if not found
-        """
-        try:
-            sample_path = UPLOAD_FOLDER / 'sample.mp4'
-            if not sample_path.exists():
-                return jsonify({
-                    "error": "Sample video not found",
-                    "message": "Please place a sample.mp4 file in the backend/uploads directory"
-                }), 404
-
-            return send_file(
-                str(sample_path),
-                mimetype='video/mp4',
-                as_attachment=False,
-                download_name='sample.mp4'
-            )
-        except Exception as e:
-            logger.error(f"Sample video error: {e}")
-            return jsonify({"error": str(e)}), 500
+    # Bounded worker pool for background jobs - excess jobs wait in the
+    # executor queue instead of each getting its own thread
+    cfg.processing_executor = ThreadPoolExecutor(
+        max_workers=cfg.MAX_CONCURRENT_JOBS,
+        thread_name_prefix='video-job'
+    )
 
-    @app.route("/api/upload", methods=["POST"])
-    def upload_video():
-        """
-        Upload a video file
+    # Pre-serialized bodies for errors that never change at runtime
+    cfg.error_bodies = {key: json.dumps({"error": message}) for key, message in ERROR_MESSAGES.items()}
+    cfg.error_bodies['file_too_large'] = json.dumps({"error": f"File too large. Max size: {cfg.MAX_FILE_SIZE / (1024*1024)}MB"})
+    cfg.error_bodies['file_type_not_allowed'] = json.dumps({"error": f"File type not allowed. Allowed types: {', '.join(cfg.ALLOWED_EXTENSIONS)}"})
 
-        Returns:
-            JSON with video metadata and file path
-        """
-        try:
-            # Check if file is in request
-            if 'file' not in request.files:
-                return jsonify({"error": "No file part in request"}), 400
-
-            file = request.files['file']
-
-            # Check if file is selected
-            if file.filename == '':
-                return jsonify({"error": "No file selected"}), 400
-
-            # Validate file type
-            if not allowed_file(file.filename):
-                return jsonify({
-                    "error": f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-                }), 400
-
-            # Generate unique filename
-            file_extension = file.filename.rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            file_path = UPLOAD_FOLDER / unique_filename
-
-            # Save file
-            file.save(str(file_path))
-            file_size = os.path.getsize(file_path)
-
-            # Check file size
-            if file_size > MAX_FILE_SIZE:
-                os.remove(file_path)
-                return jsonify({
-                    "error": f"File too large. Max size: {MAX_FILE_SIZE / (1024*1024)}MB"
-                }), 400
-
-            logger.info(f"Video uploaded successfully: {unique_filename} ({file_size} bytes)")
-
-            return jsonify({
-                "success": True,
-                "message": "Video uploaded successfully",
-                "video_id": unique_filename,
-                "original_filename": file.filename,
-                "file_path": str(file_path),
-                "file_size": file_size
-            }), 200
+    @functools.lru_cache(maxsize=1)
+    def model_info_body():
+        """Model and device info is fixed for the life of the process"""
+        body = app.json.dumps(cfg.get_processor().get_model_info()).encode('utf-8')
+        return body, gzip.compress(body, 9)
 
-        except Exception as e:
-            logger.error(f"Upload error: {e}")
-            return jsonify({"error": str(e)}), 500
-
-    @app.route("/api/process/start", methods=["POST"])
-    def start_processing():
-        """
-        Start async video processing job
-
-        Request body:
-            video_id: str - Video filename from upload
-            filter_type: str - Type of filter (grayscale, blur, sepia)
-            apply_to: str - Where to apply (background, person)
-            no_person_behavior: str - What to do when no person detected
-            confidence_threshold: float - Detection confidence (0.0-1.0)
-            region_aware: bool - Only process column/region where person appears
-            roi_expansion: float - Region expansion factor 0.0-1.0
-            boundary_refinement: str - Refinement level: minimal, balanced, aggressive
-            use_sam: bool - Enable SAM for pixel-perfect boundary refinement
-
-        Returns:
-            JSON with job_id for tracking
-        """
-        try:
-            data = request.get_json()
+    cfg.model_info_body = model_info_body
 
-            # Validate required fields
-            if not data or 'video_id' not in data:
-                return jsonify({"error": "video_id is required"}), 400
+    app.extensions['video_config'] = cfg
+    app.register_blueprint(bp)
 
-            video_id = data['video_id']
 
-            # Validate input video exists
-            input_path = UPLOAD_FOLDER / video_id
-            if not input_path.exists():
-                return jsonify({"error": f"Video not found: {video_id}"}), 404
+@bp.route("/hello-world", methods=["GET"])
+def hello_world():
+    """Health check endpoint"""
+    cfg = _config()
+    try:
+        return jsonify({"Hello": "World"}), 200
+    except Exception as e:
+        cfg.logger.error(f"Error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-            # Create job
-            params = {
-                'filter_type': data.get('filter_type', 'grayscale'),
-                'apply_to': data.get('apply_to', 'background'),
-                'no_person_behavior': data.get('no_person_behavior', 'keep_original'),
-                'confidence_threshold': data.get('confidence_threshold', 0.5),
-                'region_aware': data.get('region_aware', True),
-                'roi_expansion': data.get('roi_expansion', 0.3),
-                'boundary_refinement': data.get('boundary_refinement', 'balanced'),
-                'use_sam': data.get('use_sam', False)
-            }
 
-            job_id = create_job(video_id, params)
+@bp.route("/sample.mp4", methods=["GET"])
+def serve_sample_video():
+    """
+    Serve sample video for demo
 
-            # Start background processing
-            thread = threading.Thread(target=process_video_background, args=(job_id,))
-            thread.daemon = True
-            thread.start()
+    Returns:
+        Sample video file or 404 if not found
+    """
+    cfg = _config()
+    try:
+        # send_file stats the file itself; a missing file raises
+        # FileNotFoundError, so no separate exists() check is needed
+        sample_path = cfg.UPLOAD_FOLDER / 'sample.mp4'
+        return send_file(
+            str(sample_path),
+            mimetype='video/mp4',
+            as_attachment=False,
+            download_name='sample.mp4',
+            conditional=True,
+            etag=True,
+            max_age=SAMPLE_VIDEO_MAX_AGE
+        )
+    except FileNotFoundError:
+        return jsonify({
+            "error": "Sample video not found",
+            "message": "Please place a sample.mp4 file in the backend/uploads directory"
+        }), 404
+    except Exception as e:
+        cfg.logger.error(f"Sample video error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/api/upload", methods=["POST"])
+def upload_video():
+    """
+    Upload a video file
 
-            logger.info(f"Started processing job {job_id} for video {video_id}")
+    Returns:
+        JSON with video metadata and file path
+    """
+    cfg = _config()
+    spooled = []
+    try:
+        # Reject oversize uploads before any of the body is read
+        if request.content_length and request.content_length > cfg.MAX_FILE_SIZE:
+            return error_response('file_too_large', 400)
+
+        file = None
+        if request.mimetype == 'application/octet-stream':
+            # Raw body upload: the original filename travels in a header and
+            # the request stream is written straight to disk
+            original_filename = request.headers.get('X-Filename', '')
+        else:
+            # Multipart upload: the parser writes the file part straight into
+            # the upload folder, so saving it is a rename rather than a copy
+            files = _parse_multipart_upload(cfg.UPLOAD_FOLDER, cfg.MAX_FILE_SIZE, spooled)
 
-            return jsonify({
-                "success": True,
-                "job_id": job_id,
-                "message": "Processing started"
-            }), 200
+            # Check if file is in request
+            if 'file' not in files:
+                return error_response('no_file', 400)
+
+            file = files['file']
+            original_filename = file.filename
+
+        # Check if file is selected
+        if not original_filename:
+            return error_response('no_selected_file', 400)
+
+        # Validate file type
+        if not cfg.allowed_file(original_filename):
+            return error_response('file_type_not_allowed', 400)
+
+        # Generate unique filename
+        file_extension = original_filename.rsplit('.', 1)[1].lower()
+        unique_filename = f"{secrets.token_hex(16)}.{file_extension}"
+        file_path = cfg.UPLOAD_FOLDER / unique_filename
+
+        # Save file
+        if file is None:
+            file_size = _save_upload_stream(request.stream, file_path, cfg.MAX_FILE_SIZE)
+        else:
+            file_size = _move_upload(file, file_path)
+
+        # Check file size
+        if file_size is None:
+            return error_response('file_too_large', 400)
+
+        cfg.logger.info(f"Video uploaded successfully: {unique_filename} ({file_size} bytes)")
+
+        return jsonify({
+            "success": True,
+            "message": "Video uploaded successfully",
+            "video_id": unique_filename,
+            "original_filename": original_filename,
+            "file_path": str(file_path),
+            "file_size": file_size
+        }), 200
+
+    except RequestEntityTooLarge:
+        return error_response('file_too_large', 400)
+    except Exception as e:
+        cfg.logger.error(f"Upload error: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        # Remove any spooled parts that were not moved into place
+        _discard_uploads(spooled)
+
+
+def queue_processing_job(video_id, data):
+    """
+    Create a processing job from request data and queue it on the executor
 
-        except Exception as e:
-            logger.error(f"Start processing error: {e}")
-            return jsonify({"error": str(e)}), 500
+    Args:
+        video_id: Uploaded video filename
+        data: Request JSON with processing options
 
-    @app.route("/api/jobs/<job_id>/status", methods=["GET"])
-    def get_job_status(job_id):
-        """
-        Get job status and progress
+    Returns:
+        job_id of the queued job
+    """
+    cfg = _config()
+    params = {
+        'filter_type': data.get('filter_type', 'grayscale'),
+        'apply_to': data.get('apply_to', 'background'),
+        'no_person_behavior': data.get('no_person_behavior', 'keep_original'),
+        'confidence_threshold': data.get('confidence_threshold', 0.5),
+        'region_aware': data.get('region_aware', True),
+        'roi_expansion': data.get('roi_expansion', 0.3),
+        'boundary_refinement': data.get('boundary_refinement', 'balanced'),
+        'use_sam': data.get('use_sam', False)
+    }
 
-        Args:
-            job_id: Job ID from start processing
+    job_id = cfg.create_job(video_id, params)
 
-        Returns:
-            JSON with job details
-        """
-        try:
-            job = get_job(job_id)
-
-            if not job:
-                return jsonify({"error": "Job not found"}), 404
-
-            # Don't send the progress queue in response
-            response_data = {
-                'id': job['id'],
-                'status': job['status'],
-                'video_id': job['video_id'],
-                'progress': job['progress'],
-                'segments': job['segments'],
-                'output_video_id': job['output_video_id'],
-                'error': job['error'],
-                'created_at': job['created_at'],
-                'started_at': job['started_at'],
-                'completed_at': job['completed_at']
-            }
+    # Queue background processing
+    future = cfg.processing_executor.submit(cfg.process_video_background, job_id)
+    cfg.set_job_future(job_id, future)
 
-            # Always include stream URL if output_video_id exists (even during processing)
-            if job['output_video_id']:
-                response_data['stream_url'] = f"/api/stream/video/{job['output_video_id']}"
-                response_data['download_url'] = f"/api/download/{job['output_video_id']}"
+    return job_id
 
-            if job['status'] == 'complete':
-                response_data['stats'] = job.get('stats', {})
 
-            return jsonify(response_data), 200
+@bp.route("/api/process/start", methods=["POST"])
+def start_processing():
+    """
+    Start async video processing job
+
+    Request body:
+        video_id: str - Video filename from upload
+        filter_type: str - Type of filter (grayscale, blur, sepia)
+        apply_to: str - Where to apply (background, person)
+        no_person_behavior: str - What to do when no person detected
+        confidence_threshold: float - Detection confidence (0.0-1.0)
+        region_aware: bool - Only process column/region where person appears
+        roi_expansion: float - Region expansion factor 0.0-1.0
+        boundary_refinement: str - Refinement level: minimal, balanced, aggressive
+        use_sam: bool - Enable SAM for pixel-perfect boundary refinement
+
+    Returns:
+        JSON with job_id for tracking
+    """
+    cfg = _config()
+    try:
+        data = request.get_json()
 
-        except Exception as e:
-            logger.error(f"Get job status error: {e}")
-            return jsonify({"error": str(e)}), 500
+        # Validate required fields
+        if not data or 'video_id' not in data:
+            return error_response('video_id_required', 400)
 
-    @app.route("/api/stream/progress/<job_id>", methods=["GET"])
-    def stream_progress(job_id):
-        """
-        Server-Sent Events endpoint for real-time progress updates
+        video_id = data['video_id']
 
-        Args:
-            job_id: Job ID from start processing
+        # Validate input video exists
+        input_path = cfg.UPLOAD_FOLDER / video_id
+        if not input_path.exists():
+            return jsonify({"error": f"Video not found: {video_id}"}), 404
 
-        Returns:
-            SSE stream of progress updates
-        """
-        def generate():
-            from queue import Empty
+        # Backpressure: refuse new work while the executor backlog is full
+        if cfg.processing_executor._work_queue.qsize() >= cfg.MAX_QUEUED_JOBS:
+            return error_response('queue_full', 429)
 
-            job = get_job(job_id)
-            if not job:
-                yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
-                return
+        job_id = queue_processing_job(video_id, data)
 
-            progress_queue = job['progress_queue']
-            logger.info(f"SSE stream started for job {job_id}")
+        cfg.logger.info(f"Started processing job {job_id} for video {video_id}")
 
-            # Send initial status
-            yield f"data: {json.dumps({'type': 'status', 'data': {'status': job['status']}})}\n\n"
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "message": "Processing started"
+        }), 200
 
-            # Stream updates
-            while True:
+    except Exception as e:
+        cfg.logger.error(f"Start processing error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/api/jobs/<job_id>/status", methods=["GET"])
+def get_job_status(job_id):
+    """
+    Get job status and progress
+
+    Args:
+        job_id: Job ID from start processing
+
+    Returns:
+        JSON with job details
+    """
+    cfg = _config()
+    try:
+        # Frontend polls this endpoint; serve the recent serialized body
+        cached = cfg.get_cached_job_status(job_id)
+        if cached is not None:
+            return Response(cached, status=200, mimetype='application/json')
+
+        job = cfg.get_job(job_id)
+
+        if not job:
+            return error_response('job_not_found', 404)
+
+        # Don't send the progress queue in response
+        response_data = {
+            'id': job['id'],
+            'status': job['status'],
+            'video_id': job['video_id'],
+            'progress': job['progress'],
+            'segments': job['segments'],
+            'output_video_id': job['output_video_id'],
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'completed_at': job['completed_at']
+        }
+
+        # Always include stream URL if output_video_id exists (even during processing)
+        if job['output_video_id']:
+            response_data['stream_url'] = f"/api/stream/video/{job['output_video_id']}"
+            response_data['download_url'] = f"/api/download/{job['output_video_id']}"
+
+        if job['status'] == 'complete':
+            response_data['stats'] = job.get('stats', {})
+
+        body = _json_bytes(response_data)
+        cfg.cache_job_status(job_id, body)
+        return Response(body, status=200, mimetype='application/json')
+
+    except Exception as e:
+        cfg.logger.error(f"Get job status error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/api/stream/progress/<job_id>", methods=["GET"])
+def stream_progress(job_id):
+    """
+    Server-Sent Events endpoint for real-time progress updates
+
+    Args:
+        job_id: Job ID from start processing
+
+    Returns:
+        SSE stream of progress updates
+    """
+    cfg = _config()
+    def generate():
+        from queue import Empty
+
+        job = cfg.get_job(job_id)
+        if not job:
+            yield _sse_event({'error': 'Job not found'})
+            return
+
+        progress_queue = job['progress_queue']
+        done_event = job['done_event']
+        cfg.logger.info(f"SSE stream started for job {job_id}")
+
+        # Send initial status
+        yield _sse_event({'type': 'status', 'data': {'status': job['status']}})
+
+        # Bind hot-loop lookups to locals once per stream
+        queue_get = progress_queue.get
+        job_done = done_event.is_set
+        sse_event = _sse_event
+        debug_enabled = cfg.logger.isEnabledFor(logging.DEBUG)
+
+        # Stream updates
+        while True:
+            try:
+                # Block until the worker pushes an update; only wake up on
+                # an idle stream to send a keepalive
                 try:
-                    # Get progress update (timeout to check status periodically)
-                    try:
-                        update = progress_queue.get(timeout=1)
-                        logger.debug(f"SSE sending update for job {job_id}: {update.get('type')}")
-                        yield f"data: {json.dumps(update)}\n\n"
-                    except Empty:
-                        # No update available, send keepalive
-                        yield f": keepalive\n\n"
-
-                    # Check if job is complete after processing any queued messages
-                    current_job = get_job(job_id)
-                    if not current_job or current_job['status'] in ['complete', 'failed', 'cancelled']:
-                        logger.info(f"SSE job {job_id} reached terminal status: {current_job['status'] if current_job else 'unknown'}")
-                        # Drain any remaining messages in the queue
-                        while not progress_queue.empty():
-                            try:
-                                update = progress_queue.get_nowait()
-                                yield f"data: {json.dumps(update)}\n\n"
-                            except Empty:
-                                break
-
-                        # Send final status update
-                        yield f"data: {json.dumps({'type': 'status', 'data': {'status': current_job['status'] if current_job else 'unknown'}})}\n\n"
-                        logger.info(f"SSE stream closed for job {job_id}")
-                        break
-
-                except GeneratorExit:
-                    logger.info(f"SSE client disconnected for job {job_id}")
-                    break
-                except Exception as e:
-                    logger.error(f"SSE error for job {job_id}: {e}", exc_info=True)
+                    update = queue_get(timeout=SSE_KEEPALIVE_INTERVAL)
+                    if debug_enabled:
+                        cfg.logger.debug(f"SSE sending update for job {job_id}: {update.get('type')}")
+                    yield sse_event(update)
+                except Empty:
+                    # No update available, send keepalive
+                    yield b": keepalive\n\n"
+
+                # The terminal status message is queued before done_event is
+                # set, so it has already been sent or is still in the queue
+                if job_done():
+                    current_job = cfg.get_job(job_id)
+                    cfg.logger.info(f"SSE job {job_id} reached terminal status: {current_job['status'] if current_job else 'unknown'}")
+                    # Drain any remaining messages under a single lock acquisition
+                    for update in progress_queue.drain():
+                        yield sse_event(update)
+
+                    # Send final status update
+                    yield _sse_event({'type': 'status', 'data': {'status': current_job['status'] if current_job else 'unknown'}})
+                    cfg.logger.info(f"SSE stream closed for job {job_id}")
                     break
 
-        return Response(
-            stream_with_context(generate()),
-            mimetype='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'X-Accel-Buffering': 'no',
-                'Connection': 'keep-alive',
-                'Content-Type': 'text/event-stream'
-            }
-        )
+            except GeneratorExit:
+                cfg.logger.info(f"SSE client disconnected for job {job_id}")
+                break
+            except Exception as e:
+                cfg.logger.error(f"SSE error for job {job_id}: {e}", exc_info=True)
+                break
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'Connection': 'keep-alive',
+            'Content-Type': 'text/event-stream'
+        }
+    )
+
+
+@bp.route("/api/jobs/<job_id>/cancel", methods=["DELETE"])
+def cancel_job(job_id):
+    """
+    Cancel a running job
 
-    @app.route("/api/jobs/<job_id>/cancel", methods=["DELETE"])
-    def cancel_job(job_id):
-        """
-        Cancel a running job
+    Args:
+        job_id: Job ID to cancel
 
-        Args:
-            job_id: Job ID to cancel
+    Returns:
+        JSON with cancellation status
+    """
+    cfg = _config()
+    try:
+        job = cfg.get_job(job_id)
 
-        Returns:
-            JSON with cancellation status
-        """
-        try:
-            job = get_job(job_id)
+        if not job:
+            return error_response('job_not_found', 404)
 
-            if not job:
-                return jsonify({"error": "Job not found"}), 404
+        if job['status'] in ['complete', 'failed']:
+            return error_response('job_finished', 400)
 
-            if job['status'] in ['complete', 'failed']:
-                return jsonify({"error": "Job already finished"}), 400
+        # Drop the job from the executor queue if it has not started yet
+        future = job.get('future')
+        if future is not None:
+            future.cancel()
 
-            update_job_status(job_id, 'cancelled')
+        cfg.update_job_status(job_id, 'cancelled')
 
-            logger.info(f"Job {job_id} cancelled")
+        cfg.logger.info(f"Job {job_id} cancelled")
 
-            return jsonify({
-                "success": True,
-                "message": "Job cancelled"
-            }), 200
+        return jsonify({
+            "success": True,
+            "message": "Job cancelled"
+        }), 200
 
-        except Exception as e:
-            logger.error(f"Cancel job error: {e}")
-            return jsonify({"error": str(e)}), 500
-
-    @app.route("/api/process/selective-filter", methods=["POST"])
-    def process_video():
-        """
-        Process video with selective filtering based on person segmentation
-
-        Request body:
-            video_id: str - Video filename from upload
-            filter_type: str - Type of filter (grayscale, blur, sepia)
-            apply_to: str - Where to apply (background, person)
-            no_person_behavior: str - What to do when no person detected
-            confidence_threshold: float - Detection confidence (0.0-1.0)
-            region_aware: bool - Only process column/region where person appears (default: True)
-            roi_expansion: float - Region expansion factor 0.0-1.0 (default: 0.3)
-            boundary_refinement: str - Refinement level: minimal, balanced, aggressive (default: balanced)
-            use_sam: bool - Enable SAM for pixel-perfect boundary refinement (default: False)
-
-        Returns:
-            JSON with processing statistics and processed video path
-        """
-        try:
-            data = request.get_json()
-
-            # Validate required fields
-            if not data or 'video_id' not in data:
-                return jsonify({"error": "video_id is required"}), 400
-
-            video_id = data['video_id']
-            filter_type = data.get('filter_type', 'grayscale')
-            apply_to = data.get('apply_to', 'background')
-            no_person_behavior = data.get('no_person_behavior', 'keep_original')
-            confidence_threshold = data.get('confidence_threshold', 0.5)
-            region_aware = data.get('region_aware', True)
-            roi_expansion = data.get('roi_expansion', 0.3)
-            boundary_refinement = data.get('boundary_refinement', 'balanced')
-            use_sam = data.get('use_sam', False)
-
-            # Validate input video exists
-            input_path = UPLOAD_FOLDER / video_id
-            if not input_path.exists():
-                return jsonify({"error": f"Video not found: {video_id}"}), 404
+    except Exception as e:
+        cfg.logger.error(f"Cancel job error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-            # Generate output filename
-            output_filename = f"processed_{uuid.uuid4()}.mp4"
-            output_path = PROCESSED_FOLDER / output_filename
-
-            logger.info(f"Starting video processing: {video_id}")
-            logger.info(f"Settings - Filter: {filter_type}, Apply to: {apply_to}, "
-                       f"Confidence: {confidence_threshold}, Region-aware: {region_aware}, "
-                       f"Boundary refinement: {boundary_refinement}, SAM: {use_sam}")
-
-            # Get processor with SAM if requested
-            processor = get_processor(use_sam=use_sam)
-            stats = processor.process_video_selective_filter(
-                input_video_path=str(input_path),
-                output_video_path=str(output_path),
-                filter_type=filter_type,
-                apply_to=apply_to,
-                no_person_behavior=no_person_behavior,
-                confidence_threshold=confidence_threshold,
-                region_aware=region_aware,
-                roi_expansion=roi_expansion,
-                boundary_refinement=boundary_refinement
-            )
-
-            # Add output info to stats
-            stats['processed_video_id'] = output_filename
-            stats['processed_video_path'] = str(output_path)
-            stats['download_url'] = f"/api/download/{output_filename}"
-
-            logger.info(f"Video processing completed: {output_filename}")
-
-            return jsonify(stats), 200
-
-        except FileNotFoundError as e:
-            logger.error(f"File not found: {e}")
-            return jsonify({"error": str(e)}), 404
-        except Exception as e:
-            logger.error(f"Processing error: {e}", exc_info=True)
-            return jsonify({"error": str(e)}), 500
 
-    @app.route("/api/download/<video_id>", methods=["GET"])
-    def download_video(video_id):
-        """
-        Download processed video
+@bp.route("/api/process/selective-filter", methods=["POST"])
+def process_video():
+    """
+    Process video with selective filtering based on person segmentation
+
+    Request body:
+        video_id: str - Video filename from upload
+        filter_type: str - Type of filter (grayscale, blur, sepia)
+        apply_to: str - Where to apply (background, person)
+        no_person_behavior: str - What to do when no person detected
+        confidence_threshold: float - Detection confidence (0.0-1.0)
+        region_aware: bool - Only process column/region where person appears (default: True)
+        roi_expansion: float - Region expansion factor 0.0-1.0 (default: 0.3)
+        boundary_refinement: str - Refinement level: minimal, balanced, aggressive (default: balanced)
+        use_sam: bool - Enable SAM for pixel-perfect boundary refinement (default: False)
+
+    Returns:
+        202 with job_id; poll /api/jobs/<job_id>/status for the result
+    """
+    cfg = _config()
+    try:
+        data = request.get_json()
 
-        Args:
-            video_id: Processed video filename
+        # Validate required fields
+        if not data or 'video_id' not in data:
+            return error_response('video_id_required', 400)
 
-        Returns:
-            Video file
-        """
-        try:
-            file_path = PROCESSED_FOLDER / video_id
+        video_id = data['video_id']
 
-            if not file_path.exists():
-                return jsonify({"error": f"Video not found: {video_id}"}), 404
+        # Validate input video exists
+        input_path = cfg.UPLOAD_FOLDER / video_id
+        if not input_path.exists():
+            return jsonify({"error": f"Video not found: {video_id}"}), 404
 
-            return send_file(
-                str(file_path),
-                mimetype='video/mp4',
-                as_attachment=True,
-                download_name=f"processed_{video_id}"
-            )
+        # Backpressure: refuse new work while the executor backlog is full
+        if cfg.processing_executor._work_queue.qsize() >= cfg.MAX_QUEUED_JOBS:
+            return error_response('queue_full', 429)
 
-        except Exception as e:
-            logger.error(f"Download error: {e}")
-            return jsonify({"error": str(e)}), 500
+        # Processing runs on the job executor; clients poll the job status
+        job_id = queue_processing_job(video_id, data)
 
-    @app.route("/api/stream/video/<video_id>", methods=["GET"])
-    def stream_video(video_id):
-        """
-        Stream video with HTTP Range support for progressive playback
-        Supports streaming in-progress videos for real-time preview
+        cfg.logger.info(f"Queued selective-filter job {job_id} for video {video_id}")
 
-        Args:
-            video_id: Video filename (can be in-progress or completed)
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}/status"
+        }), 202
 
-        Returns:
-            Video stream with Range support
-        """
-        try:
-            file_path = PROCESSED_FOLDER / video_id
+    except FileNotFoundError as e:
+        cfg.logger.error(f"File not found: {e}")
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        cfg.logger.error(f"Processing error: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
 
-            if not file_path.exists():
-                return jsonify({"error": f"Video not found: {video_id}"}), 404
 
-            # Get file size
-            file_size = os.path.getsize(file_path)
-
-            # Parse Range header
-            range_header = request.headers.get('Range')
-
-            if not range_header:
-                # No range requested, send entire file
-                def generate():
-                    with open(str(file_path), 'rb') as f:
-                        while True:
-                            chunk = f.read(1024 * 1024)  # 1MB chunks
-                            if not chunk:
-                                break
-                            yield chunk
-
-                return Response(
-                    stream_with_context(generate()),
-                    mimetype='video/mp4',
-                    headers={
-                        'Content-Length': str(file_size),
-                        'Accept-Ranges': 'bytes',
-                        'Cache-Control': 'no-cache',
-                    }
-                )
+@bp.route("/api/download/<video_id>", methods=["GET"])
+def download_video(video_id):
+    """
+    Download processed video
 
-            # Parse range request (format: "bytes=start-end")
-            try:
-                byte_range = range_header.replace('bytes=', '').split('-')
-                start = int(byte_range[0]) if byte_range[0] else 0
-                end = int(byte_range[1]) if byte_range[1] else file_size - 1
-
-                # Ensure valid range
-                if start >= file_size:
-                    return Response(status=416)  # Range Not Satisfiable
-
-                end = min(end, file_size - 1)
-                length = end - start + 1
-
-                def generate_range():
-                    with open(str(file_path), 'rb') as f:
-                        f.seek(start)
-                        remaining = length
-                        while remaining > 0:
-                            chunk_size = min(1024 * 1024, remaining)  # 1MB chunks
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            remaining -= len(chunk)
-                            yield chunk
-
-                return Response(
-                    stream_with_context(generate_range()),
-                    status=206,  # Partial Content
-                    mimetype='video/mp4',
-                    headers={
-                        'Content-Range': f'bytes {start}-{end}/{file_size}',
-                        'Content-Length': str(length),
-                        'Accept-Ranges': 'bytes',
-                        'Cache-Control': 'no-cache',
-                    }
-                )
-            except (ValueError, IndexError):
-                return Response(status=416)  # Range Not Satisfiable
+    Args:
+        video_id: Processed video filename
 
-        except Exception as e:
-            logger.error(f"Stream video error: {e}")
-            return jsonify({"error": str(e)}), 500
+    Returns:
+        Video file
+    """
+    cfg = _config()
+    try:
+        # send_file stats the file and raises FileNotFoundError if missing
+        file_path = cfg.PROCESSED_FOLDER / video_id
+
+        # conditional=True lets Werkzeug answer Range/If-None-Match itself and
+        # hand the open file to wsgi.file_wrapper (sendfile on most servers)
+        return send_file(
+            str(file_path),
+            mimetype='video/mp4',
+            as_attachment=True,
+            download_name=f"processed_{video_id}",
+            conditional=True,
+            etag=True
+        )
 
-    @app.route("/api/preview/<filename>", methods=["GET"])
-    def serve_preview(filename):
-        """
-        Serve preview frame image
+    except FileNotFoundError:
+        return jsonify({"error": f"Video not found: {video_id}"}), 404
+    except RequestedRangeNotSatisfiable:
+        return Response(status=416)  # Range Not Satisfiable
+    except Exception as e:
+        cfg.logger.error(f"Download error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        Args:
-            filename: Preview image filename
 
-        Returns:
-            Image file
-        """
-        try:
-            file_path = PREVIEW_FOLDER / filename
+@bp.route("/api/stream/video/<video_id>", methods=["GET"])
+def stream_video(video_id):
+    """
+    Stream video with HTTP Range support for progressive playback
+    Supports streaming in-progress videos for real-time preview
 
-            if not file_path.exists():
-                return jsonify({"error": f"Preview not found: {filename}"}), 404
+    Args:
+        video_id: Video filename (can be in-progress or completed)
 
-            return send_file(
-                str(file_path),
-                mimetype='image/jpeg',
-                as_attachment=False
-            )
+    Returns:
+        Video stream with Range support
+    """
+    cfg = _config()
+    try:
+        # send_file stats the file and raises FileNotFoundError if missing
+        file_path = cfg.PROCESSED_FOLDER / video_id
+
+        # Werkzeug parses the Range header and produces the 206/416 itself.
+        # The file is stat'ed per request, so in-progress videos that are
+        # still growing are served up to their current size.
+        return send_file(
+            str(file_path),
+            mimetype='video/mp4',
+            as_attachment=False,
+            conditional=True,
+            etag=True
+        )
 
-        except Exception as e:
-            logger.error(f"Preview serve error: {e}")
-            return jsonify({"error": str(e)}), 500
+    except FileNotFoundError:
+        return jsonify({"error": f"Video not found: {video_id}"}), 404
+    except RequestedRangeNotSatisfiable:
+        return Response(status=416)  # Range Not Satisfiable
+    except Exception as e:
+        cfg.logger.error(f"Stream video error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-    @app.route("/api/model/info", methods=["GET"])
-    def model_info():
-        """
-        Get information about the AI model
 
-        Returns:
-            JSON with model information
-        """
-        try:
-            processor = get_processor()
-            info = processor.get_model_info()
-            return jsonify(info), 200
-        except Exception as e:
-            logger.error(f"Model info error: {e}")
-            return jsonify({"error": str(e)}), 500
-
-    @app.route("/api/filters", methods=["GET"])
-    def get_filters():
-        """
-        Get available filter types
-
-        Returns:
-            JSON with list of available filters
-        """
-        filters = [
-            {
-                "id": "grayscale",
-                "name": "Grayscale",
-                "description": "Convert to black and white"
-            },
-            {
-                "id": "blur",
-                "name": "Blur",
-                "description": "Apply Gaussian blur effect"
-            },
-            {
-                "id": "sepia",
-                "name": "Sepia",
-                "description": "Apply vintage sepia tone"
-            }
-        ]
-        return jsonify({"filters": filters}), 200
-
-    @app.route("/api/extract-filter-previews", methods=["POST"])
-    def extract_filter_previews():
-        """
-        Extract first keyframe and generate filter previews for all available filters
-        This is image processing with human detection applied to a single frame
-
-        Request body:
-            video_id: str - Video filename from upload
-            confidence_threshold: float - Detection confidence (0.0-1.0)
-            apply_to: str - Where to apply filter ('background' or 'person')
-
-        Returns:
-            JSON with array of filter previews (base64 encoded images)
-        """
-        try:
-            data = request.get_json()
+@bp.route("/api/preview/<filename>", methods=["GET"])
+def serve_preview(filename):
+    """
+    Serve preview frame image
 
-            # Validate required fields
-            if not data or 'video_id' not in data:
-                return jsonify({"error": "video_id is required"}), 400
+    Args:
+        filename: Preview image filename
 
-            video_id = data['video_id']
-            confidence_threshold = data.get('confidence_threshold', 0.5)
-            apply_to = data.get('apply_to', 'background')
+    Returns:
+        Image file
+    """
+    cfg = _config()
+    try:
+        # send_file stats the file and raises FileNotFoundError if missing
+        file_path = cfg.PREVIEW_FOLDER / filename
+
+        # Previews are overwritten in place: no-cache makes browsers
+        # revalidate, and an unchanged preview is answered with a 304
+        return send_file(
+            str(file_path),
+            mimetype='image/jpeg',
+            as_attachment=False,
+            conditional=True,
+            etag=True,
+            max_age=0
+        )
 
-            # Validate input video exists
-            input_path = UPLOAD_FOLDER / video_id
-            if not input_path.exists():
-                return jsonify({"error": f"Video not found: {video_id}"}), 404
+    except FileNotFoundError:
+        return jsonify({"error": f"Preview not found: {filename}"}), 404
+    except Exception as e:
+        cfg.logger.error(f"Preview serve error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-            logger.info(f"Extracting filter previews for video: {video_id}")
 
-            # Open video and extract first keyframe
-            cap = cv2.VideoCapture(str(input_path))
-            if not cap.isOpened():
-                return jsonify({"error": f"Could not open video: {video_id}"}), 500
+@bp.route("/api/model/info", methods=["GET"])
+def model_info():
+    """
+    Get information about the AI model
 
-            # Read first frame
-            ret, frame = cap.read()
-            cap.release()
+    Returns:
+        JSON with model information
+    """
+    cfg = _config()
+    try:
+        body, body_gz = cfg.model_info_body()
+        return _static_json_response(body, body_gz, MODEL_INFO_MAX_AGE)
+    except Exception as e:
+        cfg.logger.error(f"Model info error: {e}")
+        return jsonify({"error": str(e)}), 500
 
-            if not ret or frame is None:
-                return jsonify({"error": "Could not extract first frame from video"}), 500
 
-            logger.info(f"Extracted first frame: {frame.shape}")
+@bp.route("/api/filters", methods=["GET"])
+def get_filters():
+    """
+    Get available filter types
 
-            # Get processor
-            processor = get_processor(use_sam=False)  # Use YOLO-only for speed
+    Returns:
+        JSON with list of available filters
+    """
+    return _static_json_response(FILTERS_JSON, FILTERS_JSON_GZ, FILTERS_MAX_AGE)
 
-            # Available filters
-            filter_types = ['grayscale', 'blur', 'sepia']
-            previews = []
 
-            # Generate preview for each filter
-            for filter_type in filter_types:
-                try:
-                    # Run person detection on the frame
-                    results = processor.model.predict(
-                        frame,
-                        classes=[0],  # class 0 = person in COCO dataset
-                        conf=confidence_threshold,
-                        verbose=False,
-                        device=processor._get_device()
-                    )
-
-                    # Apply filter based on detection
-                    if results[0].masks is not None and len(results[0].masks) > 0:
-                        # Person detected - apply selective filter
-                        masks = results[0].masks.data.cpu().numpy()
-
-                        # Combine all person masks
-                        combined_mask = masks[0]
-                        for i in range(1, len(masks)):
-                            combined_mask = np.maximum(combined_mask, masks[i])
-
-                        height, width = frame.shape[:2]
-                        combined_mask = cv2.resize(combined_mask, (width, height))
-                        combined_mask = (combined_mask > 0.5).astype(np.uint8) * 255
-
-                        # Apply filter
-                        if filter_type == 'grayscale':
-                            filtered = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                            filtered = cv2.cvtColor(filtered, cv2.COLOR_GRAY2BGR)
-                        elif filter_type == 'blur':
-                            filtered = cv2.GaussianBlur(frame, (21, 21), 0)
-                        else:  # sepia
-                            kernel = np.array([[0.272, 0.534, 0.131],
-                                             [0.349, 0.686, 0.168],
-                                             [0.393, 0.769, 0.189]])
-                            filtered = cv2.transform(frame, kernel)
-                            filtered = np.clip(filtered, 0, 255).astype(np.uint8)
-
-                        # Composite based on mask
-                        mask_3ch = cv2.cvtColor(combined_mask, cv2.COLOR_GRAY2BGR) / 255.0
-                        if apply_to == 'background':
-                            # Filter background, keep person in color
-                            output_frame = (frame * mask_3ch + filtered * (1 - mask_3ch)).astype(np.uint8)
-                        else:
-                            # Filter person, keep background in color
-                            output_frame = (filtered * mask_3ch + frame * (1 - mask_3ch)).astype(np.uint8)
-                    else:
-                        # No person detected - apply filter to entire frame
-                        if filter_type == 'grayscale':
-                            output_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                            output_frame = cv2.cvtColor(output_frame, cv2.COLOR_GRAY2BGR)
-                        elif filter_type == 'blur':
-                            output_frame = cv2.GaussianBlur(frame, (21, 21), 0)
-                        else:  # sepia
-                            kernel = np.array([[0.272, 0.534, 0.131],
-                                             [0.349, 0.686, 0.168],
-                                             [0.393, 0.769, 0.189]])
-                            output_frame = cv2.transform(frame, kernel)
-                            output_frame = np.clip(output_frame, 0, 255).astype(np.uint8)
-
-                    # Save preview image to file
-                    preview_filename = f"{video_id}_{filter_type}_preview.jpg"
-                    preview_path = PREVIEW_FOLDER / preview_filename
-                    cv2.imwrite(str(preview_path), output_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-
-                    # Add to previews array
-                    previews.append({
-                        'filter_id': filter_type,
-                        'filter_name': filter_type.capitalize(),
-                        'preview_url': f"/api/preview/{preview_filename}"
-                    })
-
-                    logger.info(f"Generated preview for {filter_type} filter")
-
-                except Exception as e:
-                    logger.error(f"Error generating preview for {filter_type}: {e}")
-                    # Add error placeholder
-                    previews.append({
-                        'filter_id': filter_type,
-                        'filter_name': filter_type.capitalize(),
-                        'error': str(e)
-                    })
-
-            logger.info(f"Successfully generated {len(previews)} filter previews")
-
-            return jsonify({
-                "success": True,
-                "video_id": video_id,
-                "previews": previews,
-                "frame_size": {
-                    "width": frame.shape[1],
-                    "height": frame.shape[0]
-                }
-            }), 200
+@bp.route("/api/extract-filter-previews", methods=["POST"])
+def extract_filter_previews():
+    """
+    Extract first keyframe and generate filter previews for all available filters
+    This is image processing with human detection applied to a single frame
 
+    Request body:
+        video_id: str - Video filename from upload
+        confidence_threshold: float - Detection confidence (0.0-1.0)
+        apply_to: str - Where to apply filter ('background' or 'person')
+
+    Returns:
+        JSON with array of filter previews (base64 encoded images)
+    """
+    cfg = _config()
+    try:
+        data = request.get_json()
+
+        # Validate required fields
+        if not data or 'video_id' not in data:
+            return error_response('video_id_required', 400)
+
+        video_id = data['video_id']
+        confidence_threshold = data.get('confidence_threshold', 0.5)
+        apply_to = data.get('apply_to', 'background')
+
+        input_path = cfg.UPLOAD_FOLDER / video_id
+
+        cfg.logger.info(f"Extracting filter previews for video: {video_id}")
+
+        # Extract first keyframe (cached per video). Only a failed read needs
+        # the filesystem check that tells a missing video from a bad one
+        try:
+            frame_jpeg, (source_width, source_height) = _read_first_frame_jpeg(str(input_path))
+        except ValueError as e:
+            if not input_path.exists():
+                return jsonify({"error": f"Video not found: {video_id}"}), 404
+            cfg.logger.error(f"First frame extraction failed for {video_id}: {e}")
+            return error_response('no_first_frame', 500)
+
+        # The cached frame may be downscaled; frame_size reports the source
+        frame = cv2.imdecode(np.frombuffer(frame_jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+        cfg.logger.info(f"Extracted first frame: {frame.shape}")
+
+        # Get processor
+        processor = cfg.get_processor(use_sam=False)  # Use YOLO-only for speed
+
+        # Run person detection once - the same frame and mask are shared by
+        # every filter preview, so one forward pass serves all of them
+        person_mask = None
+        detection_error = None
+        try:
+            # A dedicated preview model, warmed up at FILTER_PREVIEW_IMGSZ and
+            # in FP16 on CUDA, so previews leave the video models untouched
+            preview_models = processor.preview_model_pool(FILTER_PREVIEW_IMGSZ)
+            with preview_models.borrow() as model:
+                results = model.predict(
+                    frame,
+                    classes=[0],  # class 0 = person in COCO dataset
+                    conf=confidence_threshold,
+                    verbose=False,
+                    device=processor._get_device(),
+                    **preview_models.predict_kwargs
+                )
+
+            if results[0].masks is not None and len(results[0].masks) > 0:
+                # Combine all person masks on the model device
+                height, width = frame.shape[:2]
+                person_mask = processor.combine_person_masks(
+                    results[0].masks.data, height, width
+                )
         except Exception as e:
-            logger.error(f"Extract filter previews error: {e}", exc_info=True)
-            return jsonify({"error": str(e)}), 500
+            cfg.logger.error(f"Person detection failed for filter previews: {e}")
+            detection_error = e
+
+        # Available filters
+        filter_types = ['grayscale', 'blur', 'sepia']
+        previews = []
+        # One composite buffer is reused for every filter; each preview is
+        # encoded before the next one overwrites it
+        composite = np.empty_like(frame)
+
+        # Generate preview for each filter
+        for filter_type in filter_types:
+            try:
+                if detection_error is not None:
+                    raise detection_error
+
+                # Same filter implementation as the video processor
+                filtered = apply_filter(frame, filter_type)
+
+                # Apply filter based on detection
+                if person_mask is not None:
+                    # Person detected - composite based on the binary mask.
+                    # cv2.copyTo is a masked uint8 copy, so no float blend is needed
+                    if apply_to == 'background':
+                        # Filter background, keep person in color
+                        np.copyto(composite, filtered)
+                        cv2.copyTo(frame, person_mask, composite)
+                    else:
+                        # Filter person, keep background in color
+                        np.copyto(composite, frame)
+                        cv2.copyTo(filtered, person_mask, composite)
+                    output_frame = composite
+                else:
+                    # No person detected - apply filter to entire frame
+                    output_frame = filtered
+
+                # Encode preview in memory and inline it as a data URL
+                ok, buffer = cv2.imencode('.jpg', output_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                if not ok:
+                    raise ValueError("Could not encode preview image")
+                preview_b64 = base64.b64encode(buffer).decode('ascii')
+
+                # Add to previews array
+                previews.append({
+                    'filter_id': filter_type,
+                    'filter_name': filter_type.capitalize(),
+                    'preview_data_url': f"data:image/jpeg;base64,{preview_b64}"
+                })
+
+                cfg.logger.info(f"Generated preview for {filter_type} filter")
+
+            except Exception as e:
+                cfg.logger.error(f"Error generating preview for {filter_type}: {e}")
+                # Add error placeholder
+                previews.append({
+                    'filter_id': filter_type,
+                    'filter_name': filter_type.capitalize(),
+                    'error': str(e)
+                })
+
+        cfg.logger.info(f"Successfully generated {len(previews)} filter previews")
+
+        return jsonify({
+            "success": True,
+            "video_id": video_id,
+            "previews": previews,
+            "frame_size": {
+                "width": source_width,
+                "height": source_height
+            }
+        }), 200
+
+    except Exception as e:
+        cfg.logger.error(f"Extract filter previews error: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for the video processing backend.
+
+Usage (from the backend directory):
+    gunicorn -c gunicorn.conf.py main:app
+"""
+
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:8080')
+
+# Job state, SSE progress queues and the loaded model all live in process
+# memory, so every request for a job must reach the same process
+workers = 1
+
+# Open SSE progress streams and video streams hold a thread for their whole
+# lifetime - use a large thread pool so long-lived streams don't starve
+# regular API requests
+# gevent is not used: background jobs run long native calls (decode,
+# inference, encode) that would block its single event loop. For many
+# concurrent SSE clients, put an HTTP/2 proxy (nginx, Caddy) in front so
+# browsers are not capped at 6 HTTP/1.1 connections per host.
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 64))
+
+# Let idle keep-alive connections (video players issuing Range requests)
+# be reused instead of reconnecting
+keepalive = 5
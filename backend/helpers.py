@@ -6,42 +6,122 @@ Contains file validation, job management, and background processing functions.
 import logging
 import ffmpeg
 import os
-import uuid
+import base64
+import secrets
 import cv2
 import threading
 import time
 from datetime import datetime
-from queue import Queue
+from queue import Empty
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-# A lightweight face detection model
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Job management state
+# simplejpeg is optional - libjpeg-turbo encoder straight to bytes
+try:
+    import simplejpeg
+    SIMPLEJPEG_AVAILABLE = True
+except ImportError:
+    SIMPLEJPEG_AVAILABLE = False
+
+# Job management state. jobs_lock only guards inserting into the jobs dict;
+# each job has its own 'lock' for mutating its fields, so progress updates of
+# one job never wait on another. Reads use the atomic dict.get.
 jobs = {}
 jobs_lock = threading.Lock()
+TERMINAL_JOB_STATUSES = frozenset({'complete', 'failed', 'cancelled'})
+# Progress samples used for the fps/ETA estimate (one per progress callback)
+FPS_WINDOW_SAMPLES = 10
+
+# Short-lived cache of serialized job status responses, keyed by job_id.
+# Entries expire after JOB_STATUS_CACHE_TTL and are dropped on status changes.
+JOB_STATUS_CACHE_TTL = 0.5  # seconds
+JOB_STATUS_CACHE_MAX = 4096
+job_status_cache = {}
+job_status_cache_lock = threading.Lock()
+
+# Job preview JPEGs are written by a single background thread. Each job keeps
+# at most one pending frame (latest wins), so a slow writer never backs up.
+preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-preview')
+pending_previews = {}
+pending_previews_lock = threading.Lock()
+PREVIEW_MAX_WIDTH = 640
+PREVIEW_JPEG_QUALITY = 75
+# Downscale destination buffers, keyed by (height, width). Only the single
+# preview thread touches these, so they are reused without locking.
+preview_scratch = {}
+
+
+class ProgressQueue:
+    """
+    Per-job SSE message queue where progress updates are latest-wins.
+
+    A 'progress' message replaces a 'progress' message still waiting at the
+    tail, so a slow or disconnected SSE client never accumulates a backlog of
+    stale progress ticks. Other messages (status, stream_ready) are always
+    delivered in order.
+    """
+
+    def __init__(self):
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """Queue a message, coalescing it with a pending progress update"""
+        with self._cond:
+            if (item.get('type') == 'progress' and self._items and
+                    self._items[-1].get('type') == 'progress'):
+                # Keep a preview announcement the replaced update carried
+                pending = self._items[-1]['data']
+                carried = {key: pending[key] for key in ('preview_url', 'preview_data_url')
+                           if key in pending and key not in item['data']}
+                if carried:
+                    item = {'type': 'progress', 'data': dict(item['data'], **carried)}
+                self._items[-1] = item
+            else:
+                self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the next message
+
+        Raises:
+            queue.Empty: If no message arrives within timeout seconds
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise Empty
+            return self._items.popleft()
+
+    def drain(self):
+        """Remove and return all pending messages"""
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+            return items
 
 
 def get_temp_path():
     """Generate a temporary file path"""
     temp_dir = os.path.join(os.path.dirname(__file__), "temp")
     os.makedirs(temp_dir, exist_ok=True)
-    random_filename = f"temp_{str(uuid.uuid4())[:8]}"
+    random_filename = f"temp_{secrets.token_hex(4)}"
     return os.path.join(temp_dir, random_filename)
 
 
-def allowed_file(filename, allowed_extensions):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
+def allowed_file(filename, allowed_suffixes):
+    """Check if file extension is allowed (allowed_suffixes: tuple like ('.mp4',))"""
+    return filename.lower().endswith(allowed_suffixes)
 
 
 def create_job(video_id, params):
     """Create a new processing job"""
-    job_id = str(uuid.uuid4())
+    job_id = secrets.token_hex(16)
     output_filename = f"processed_{job_id}.mp4"
     with jobs_lock:
         jobs[job_id] = {
@@ -62,85 +142,232 @@ def create_job(video_id, params):
             'created_at': datetime.now().isoformat(),
             'started_at': None,
             'completed_at': None,
-            'progress_queue': Queue()
+            'progress_queue': ProgressQueue(),
+            'done_event': threading.Event(),  # Set once the job reaches a terminal status
+            'lock': threading.Lock()
         }
     return job_id
 
 
 def update_job_progress(job_id, current, total, fps=0, preview_frame=None, preview_folder=None):
     """Update job progress"""
-    with jobs_lock:
-        if job_id in jobs:
-            percentage = (current / total * 100) if total > 0 else 0
-            remaining_frames = total - current
-            eta_seconds = (remaining_frames / fps) if fps > 0 else 0
-
-            progress_data = {
-                'current': current,
-                'total': total,
-                'percentage': round(percentage, 2),
-                'fps': round(fps, 2),
-                'eta_seconds': round(eta_seconds, 2)
-            }
-
-            # Save preview frame if provided
-            if preview_frame is not None and preview_folder is not None:
-                try:
-                    preview_path = preview_folder / f"{job_id}_preview.jpg"
-                    cv2.imwrite(str(preview_path), preview_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                    progress_data['preview_url'] = f"/api/preview/{job_id}_preview.jpg"
-                    jobs[job_id]['latest_preview'] = str(preview_path)
-                except Exception as e:
-                    logger.error(f"Failed to save preview frame: {e}")
-
-            jobs[job_id]['progress'] = progress_data
-
-            # Push to progress queue for SSE
-            try:
-                jobs[job_id]['progress_queue'].put({
-                    'type': 'progress',
-                    'data': progress_data
-                }, block=False)
-            except Exception as e:
-                logger.warning(f"Failed to push progress to queue for job {job_id}: {e}")
+    # Hand preview frames to the preview writer so encoding never blocks processing
+    if preview_frame is not None and preview_folder is not None:
+        submit_job_preview(job_id, preview_frame, preview_folder)
+
+    job = jobs.get(job_id)
+    if job is None:
+        return
+
+    percentage = (current / total * 100) if total > 0 else 0
+    remaining_frames = total - current
+    eta_seconds = (remaining_frames / fps) if fps > 0 else 0
+
+    progress_data = {
+        'current': current,
+        'total': total,
+        'percentage': round(percentage, 2),
+        'fps': round(fps, 2),
+        'eta_seconds': round(eta_seconds, 2)
+    }
+
+    with job['lock']:
+        job['progress'] = progress_data
+
+    # Push to progress queue for SSE (the queue has its own lock)
+    try:
+        job['progress_queue'].put({
+            'type': 'progress',
+            'data': progress_data
+        })
+    except Exception as e:
+        logger.warning(f"Failed to push progress to queue for job {job_id}: {e}")
+
+
+def submit_job_preview(job_id, preview_frame, preview_folder):
+    """
+    Queue a preview frame to be written by the preview thread
+
+    Only the latest frame per job is kept: if a write for the job is already
+    pending, its frame is replaced instead of queueing another write.
+
+    Args:
+        job_id: Job identifier
+        preview_frame: BGR frame to save
+        preview_folder: Path to preview frames directory
+    """
+    with pending_previews_lock:
+        already_pending = job_id in pending_previews
+        pending_previews[job_id] = preview_frame
+    if not already_pending:
+        preview_executor.submit(write_job_preview, job_id, preview_folder)
+
+
+def encode_preview_jpeg(frame):
+    """
+    JPEG-encode a BGR preview frame
+
+    Args:
+        frame: BGR frame
+
+    Returns:
+        Encoded JPEG as bytes (simplejpeg) or a uint8 numpy buffer (OpenCV)
+    """
+    if SIMPLEJPEG_AVAILABLE:
+        # 4:2:0 matches OpenCV's default output, keeping previews the same size
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame),
+            quality=PREVIEW_JPEG_QUALITY,
+            colorspace='BGR',
+            colorsubsampling='420',
+            fastdct=True
+        )
+
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode preview frame")
+    return buffer
+
+
+def write_job_preview(job_id, preview_folder):
+    """Write the latest pending preview for a job and announce it over SSE"""
+    with pending_previews_lock:
+        preview_frame = pending_previews.pop(job_id, None)
+    if preview_frame is None:
+        return
+
+    try:
+        # Previews are only shown as thumbnails - downscale before encoding
+        width = preview_frame.shape[1]
+        if width > PREVIEW_MAX_WIDTH:
+            height = preview_frame.shape[0]
+            size = (PREVIEW_MAX_WIDTH, max(1, round(height * PREVIEW_MAX_WIDTH / width)))
+            scratch = preview_scratch.get(size)
+            if scratch is None:
+                scratch = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                preview_scratch[size] = scratch
+            preview_frame = cv2.resize(preview_frame, size, dst=scratch, interpolation=cv2.INTER_AREA)
+
+        buffer = encode_preview_jpeg(preview_frame)
+
+        # Write then rename so clients never fetch a half-written preview
+        preview_path = preview_folder / f"{job_id}_preview.jpg"
+        tmp_path = preview_folder / f".{job_id}_preview.jpg.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer)
+        os.replace(tmp_path, preview_path)
+    except Exception as e:
+        logger.error(f"Failed to save preview frame: {e}")
+        return
+
+    job = jobs.get(job_id)
+    if job is None:
+        return
+
+    with job['lock']:
+        progress_data = dict(job['progress'])
+        progress_data['preview_url'] = f"/api/preview/{job_id}_preview.jpg"
+        job['progress'] = progress_data
+        job['latest_preview'] = str(preview_path)
+
+    # The SSE event also carries the JPEG inline, so clients can show it
+    # without a second request; job status only keeps the URL
+    event_data = dict(progress_data)
+    event_data['preview_data_url'] = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('ascii')}"
+
+    try:
+        job['progress_queue'].put({
+            'type': 'progress',
+            'data': event_data
+        })
+    except Exception as e:
+        logger.warning(f"Failed to push preview to queue for job {job_id}: {e}")
+
+
+def get_cached_job_status(job_id):
+    """Get a cached job status response body, or None if missing/expired"""
+    with job_status_cache_lock:
+        entry = job_status_cache.get(job_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def cache_job_status(job_id, body):
+    """Cache a serialized job status response body"""
+    with job_status_cache_lock:
+        if len(job_status_cache) >= JOB_STATUS_CACHE_MAX:
+            job_status_cache.clear()
+        job_status_cache[job_id] = (time.monotonic() + JOB_STATUS_CACHE_TTL, body)
+
+
+def invalidate_job_status(job_id):
+    """Drop the cached status response for a job"""
+    with job_status_cache_lock:
+        job_status_cache.pop(job_id, None)
 
 
 def update_job_status(job_id, status, error=None):
     """Update job status"""
-    with jobs_lock:
-        if job_id in jobs:
-            jobs[job_id]['status'] = status
-            if error:
-                jobs[job_id]['error'] = str(error)
-
-            if status == 'processing' and not jobs[job_id]['started_at']:
-                jobs[job_id]['started_at'] = datetime.now().isoformat()
-            elif status in ['complete', 'failed', 'cancelled']:
-                jobs[job_id]['completed_at'] = datetime.now().isoformat()
-
-            # Push to progress queue for SSE
-            try:
-                jobs[job_id]['progress_queue'].put({
-                    'type': 'status',
-                    'data': {'status': status, 'error': error}
-                }, block=False)
-            except Exception as e:
-                logger.warning(f"Failed to push status to queue for job {job_id}: {e}")
+    job = jobs.get(job_id)
+    if job is None:
+        return
+
+    terminal = status in TERMINAL_JOB_STATUSES
+    # Format the timestamp before taking the job lock
+    now = datetime.now().isoformat()
+
+    with job['lock']:
+        job['status'] = status
+        if error:
+            job['error'] = str(error)
+
+        if status == 'processing' and not job['started_at']:
+            job['started_at'] = now
+        elif terminal:
+            job['completed_at'] = now
+
+    # Push to progress queue for SSE
+    try:
+        job['progress_queue'].put({
+            'type': 'status',
+            'data': {'status': status, 'error': error}
+        })
+    except Exception as e:
+        logger.warning(f"Failed to push status to queue for job {job_id}: {e}")
+
+    # Signal SSE streams after the status message is queued
+    if terminal:
+        job['done_event'].set()
+
+    invalidate_job_status(job_id)
 
 
 def add_job_segment(job_id, segment_num):
     """Add completed segment to job"""
-    with jobs_lock:
-        if job_id in jobs:
-            if segment_num not in jobs[job_id]['segments']:
-                jobs[job_id]['segments'].append(segment_num)
-                jobs[job_id]['segments'].sort()
+    job = jobs.get(job_id)
+    if job is None:
+        return
+
+    with job['lock']:
+        if segment_num not in job['segments']:
+            job['segments'].append(segment_num)
+            job['segments'].sort()
+
+
+def set_job_future(job_id, future):
+    """Attach the executor future running a job so it can be cancelled"""
+    job = jobs.get(job_id)
+    if job is None:
+        return
+
+    with job['lock']:
+        job['future'] = future
 
 
 def get_job(job_id):
     """Get job by ID"""
-    with jobs_lock:
-        return jobs.get(job_id)
+    return jobs.get(job_id)
 
 
 def process_video_background(job_id, upload_folder, processed_folder, preview_folder, get_processor_func, update_job_progress_func, update_job_status_func, get_job_func):
@@ -162,20 +389,22 @@ def process_video_background(job_id, upload_folder, processed_folder, preview_fo
         if not job:
             return
 
+        # Job may have been cancelled while waiting in the executor queue
+        if job['status'] == 'cancelled':
+            return
+
         update_job_status_func(job_id, 'processing')
 
         video_id = job['video_id']
         params = job['params']
 
-        # Validate input video exists
-        input_path = upload_folder / video_id
-        if not input_path.exists():
-            update_job_status_func(job_id, 'failed', f"Video not found: {video_id}")
-            return
+        # The route already checked the upload exists, and the processor
+        # raises FileNotFoundError (failing the job) if it has since gone
+        input_path = str(upload_folder / video_id)
 
         # Use output filename from job (already set in create_job)
         output_filename = job['output_video_id']
-        output_path = processed_folder / output_filename
+        output_path = str(processed_folder / output_filename)
 
         logger.info(f"Starting background processing for job {job_id}")
 
@@ -184,136 +413,62 @@ def process_video_background(job_id, upload_folder, processed_folder, preview_fo
         logger.info(f"Processing with use_sam={use_sam_param}")
         processor = get_processor_func(use_sam=use_sam_param)
 
-        # Open input video for preview extraction
-        preview_cap = cv2.VideoCapture(str(input_path))
         last_preview_frame = [0]  # Track last frame we saved preview for
-
-        # Progress callback with preview frame extraction
-        def progress_callback(progress_percent, current, total):
-            fps = current / (time.time() - start_time) if (time.time() - start_time) > 0 else 0
-
-            # Extract preview frame every 10 frames
-            # NOTE: We do NOT use processor methods here to avoid corrupting temporal state
-            if current - last_preview_frame[0] >= 10 and current > 0:
+        # Recent (timestamp, frame) samples - fps over this window tracks the
+        # current speed, so ETA recovers quickly after model warmup
+        fps_window = deque(maxlen=FPS_WINDOW_SAMPLES)
+
+        # Progress callback - the processor passes the frame it just wrote, so
+        # previews show the real output without decoding or running inference again
+        def progress_callback(progress_percent, current, total, preview_frame=None):
+            now = time.time()
+            fps_window.append((now, current))
+            oldest_time, oldest_frame = fps_window[0]
+            elapsed = now - oldest_time
+            fps = (current - oldest_frame) / elapsed if elapsed > 0 else 0
+
+            # Save a preview frame every 10 frames
+            if preview_frame is not None and current - last_preview_frame[0] >= 10 and current > 0:
                 last_preview_frame[0] = current
-                try:
-                    # Seek to current frame in input video
-                    preview_cap.set(cv2.CAP_PROP_POS_FRAMES, current - 1)
-                    ret, frame = preview_cap.read()
-                    if ret:
-                        # Simple YOLO inference WITHOUT temporal smoothing
-                        results = processor.model.predict(
-                            frame,
-                            classes=[0],
-                            conf=params.get('confidence_threshold', 0.5),
-                            verbose=False,
-                            device=processor._get_device()
-                        )
-
-                        # Apply filter based on detection
-                        if results[0].masks is not None and len(results[0].masks) > 0:
-                            # Get combined mask - basic approach without temporal smoothing
-                            masks = results[0].masks.data.cpu().numpy()
-                            combined_mask = masks[0]
-                            for i in range(1, len(masks)):
-                                combined_mask = np.maximum(combined_mask, masks[i])
-
-                            height, width = frame.shape[:2]
-                            combined_mask = cv2.resize(combined_mask, (width, height))
-                            combined_mask = (combined_mask > 0.5).astype(np.uint8) * 255
-
-                            # Apply filter manually without using processor methods
-                            filter_type = params.get('filter_type', 'grayscale')
-                            apply_to = params.get('apply_to', 'background')
-
-                            # Create filtered version
-                            if filter_type == 'grayscale':
-                                filtered = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                                filtered = cv2.cvtColor(filtered, cv2.COLOR_GRAY2BGR)
-                            elif filter_type == 'blur':
-                                filtered = cv2.GaussianBlur(frame, (21, 21), 0)
-                            else:  # sepia
-                                kernel = np.array([[0.272, 0.534, 0.131],
-                                                   [0.349, 0.686, 0.168],
-                                                   [0.393, 0.769, 0.189]])
-                                filtered = cv2.transform(frame, kernel)
-                                filtered = np.clip(filtered, 0, 255).astype(np.uint8)
-
-                            # Composite based on mask
-                            mask_3ch = cv2.cvtColor(combined_mask, cv2.COLOR_GRAY2BGR) / 255.0
-                            if apply_to == 'background':
-                                # Invert mask - filter background, keep person
-                                preview_frame = (frame * mask_3ch + filtered * (1 - mask_3ch)).astype(np.uint8)
-                            else:
-                                # Filter person, keep background
-                                preview_frame = (filtered * mask_3ch + frame * (1 - mask_3ch)).astype(np.uint8)
-                        else:
-                            # No person detected
-                            if params.get('no_person_behavior', 'keep_original') == 'keep_original':
-                                preview_frame = frame
-                            else:
-                                # Apply filter to whole frame
-                                filter_type = params.get('filter_type', 'grayscale')
-                                if filter_type == 'grayscale':
-                                    preview_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                                    preview_frame = cv2.cvtColor(preview_frame, cv2.COLOR_GRAY2BGR)
-                                elif filter_type == 'blur':
-                                    preview_frame = cv2.GaussianBlur(frame, (21, 21), 0)
-                                else:  # sepia
-                                    kernel = np.array([[0.272, 0.534, 0.131],
-                                                       [0.349, 0.686, 0.168],
-                                                       [0.393, 0.769, 0.189]])
-                                    preview_frame = cv2.transform(frame, kernel)
-                                    preview_frame = np.clip(preview_frame, 0, 255).astype(np.uint8)
-
-                        # Update with preview frame
-                        update_job_progress_func(job_id, current, total, fps, preview_frame)
-                        return
-                except Exception as e:
-                    logger.error(f"Failed to generate preview frame: {e}")
+                update_job_progress_func(job_id, current, total, fps, preview_frame)
+                return
 
             # Regular progress update without frame
             update_job_progress_func(job_id, current, total, fps)
 
-        start_time = time.time()
-
+        fps_window.append((time.time(), 0))
+
+        stats = processor.process_video_selective_filter(
+            input_video_path=input_path,
+            output_video_path=output_path,
+            filter_type=params.get('filter_type', 'grayscale'),
+            apply_to=params.get('apply_to', 'background'),
+            no_person_behavior=params.get('no_person_behavior', 'keep_original'),
+            confidence_threshold=params.get('confidence_threshold', 0.5),
+            region_aware=params.get('region_aware', True),
+            roi_expansion=params.get('roi_expansion', 0.3),
+            boundary_refinement=params.get('boundary_refinement', 'balanced'),
+            progress_callback=progress_callback
+        )
+
+        # Update job with completion info
+        with job['lock']:
+            job['stats'] = stats
+
+        # Push stream_url update via SSE
         try:
-            stats = processor.process_video_selective_filter(
-                input_video_path=str(input_path),
-                output_video_path=str(output_path),
-                filter_type=params.get('filter_type', 'grayscale'),
-                apply_to=params.get('apply_to', 'background'),
-                no_person_behavior=params.get('no_person_behavior', 'keep_original'),
-                confidence_threshold=params.get('confidence_threshold', 0.5),
-                region_aware=params.get('region_aware', True),
-                roi_expansion=params.get('roi_expansion', 0.3),
-                boundary_refinement=params.get('boundary_refinement', 'balanced'),
-                progress_callback=progress_callback
-            )
-
-            # Update job with completion info
-            with jobs_lock:
-                jobs[job_id]['stats'] = stats
-
-            # Push stream_url update via SSE
-            with jobs_lock:
-                if job_id in jobs:
-                    try:
-                        jobs[job_id]['progress_queue'].put({
-                            'type': 'stream_ready',
-                            'data': {
-                                'stream_url': f"/api/stream/video/{output_filename}",
-                                'output_video_id': output_filename
-                            }
-                        })
-                    except:
-                        pass
-
-            update_job_status_func(job_id, 'complete')
-            logger.info(f"Background processing completed for job {job_id}")
-        finally:
-            # Clean up preview video capture
-            preview_cap.release()
+            job['progress_queue'].put({
+                'type': 'stream_ready',
+                'data': {
+                    'stream_url': f"/api/stream/video/{output_filename}",
+                    'output_video_id': output_filename
+                }
+            })
+        except:
+            pass
+
+        update_job_status_func(job_id, 'complete')
+        logger.info(f"Background processing completed for job {job_id}")
 
     except Exception as e:
         logger.error(f"Background processing error for job {job_id}: {e}", exc_info=True)
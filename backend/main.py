@@ -3,8 +3,10 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 import logging
 import os
+import functools
 from pathlib import Path
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import FileWrapper
 import uuid
 from video_processor import get_video_processor
 import threading
@@ -29,8 +31,78 @@ logger = logging.getLogger(__name__)
 UPLOAD_FOLDER = Path(__file__).parent / 'uploads'
 PROCESSED_FOLDER = Path(__file__).parent / 'processed'
 SEGMENTS_FOLDER = Path(__file__).parent / 'segments'
-ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi', 'webm', 'mkv'}
+ALLOWED_EXTENSIONS = frozenset({'mp4', 'mov', 'avi', 'webm', 'mkv'})
+ALLOWED_SUFFIXES = tuple(f".{ext}" for ext in ALLOWED_EXTENSIONS)
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
+# Videos processed at once; each job holds a YOLO model and its buffers
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', 2))
+MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 16))
+# Read block size for file responses (video download and streaming)
+FILE_RESPONSE_BLOCK_SIZE = 4 * 1024 * 1024  # 4MB
+# Let Werkzeug cap request bodies too, including chunked uploads
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Debug server and reloader are opt-in; production runs under gunicorn
+DEBUG = os.getenv('FLASK_DEBUG') == '1'
+
+# Behind Apache (mod_xsendfile) or lighttpd, hand file bodies to the proxy
+# via X-Sendfile. Not for nginx, which ignores X-Sendfile and would send
+# empty bodies
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
+
+
+@functools.lru_cache(maxsize=None)
+def large_block_file_wrapper(base):
+    """
+    Subclass a server's wsgi.file_wrapper to read large, seekable blocks
+
+    Full-file responses still go through the server's sendfile path since the
+    subclass passes its isinstance check. Range responses are iterated in
+    Python, so they benefit from the larger block size and from seek support
+    (gunicorn's wrapper can't seek, so every range would read from byte 0).
+
+    Args:
+        base: File wrapper class provided by the WSGI server
+
+    Returns:
+        Subclass of base using FILE_RESPONSE_BLOCK_SIZE
+    """
+    class LargeBlockFileWrapper(base):
+        def __init__(self, filelike, block_size=None):
+            super().__init__(filelike, FILE_RESPONSE_BLOCK_SIZE)
+            self._source = filelike
+
+        def seekable(self):
+            return hasattr(self._source, 'seek')
+
+        def seek(self, *args):
+            self._source.seek(*args)
+
+        def tell(self):
+            return self._source.tell()
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            data = self._source.read(FILE_RESPONSE_BLOCK_SIZE)
+            if data:
+                return data
+            raise StopIteration()
+
+    return LargeBlockFileWrapper
+
+
+def large_block_file_responses(wsgi_app):
+    """WSGI middleware installing the large block file wrapper"""
+    def middleware(environ, start_response):
+        base = environ.get('wsgi.file_wrapper', FileWrapper)
+        if isinstance(base, type):
+            environ['wsgi.file_wrapper'] = large_block_file_wrapper(base)
+        return wsgi_app(environ, start_response)
+    return middleware
+
+
+app.wsgi_app = large_block_file_responses(app.wsgi_app)
 
 # Create directories
 UPLOAD_FOLDER.mkdir(exist_ok=True)
@@ -44,44 +116,38 @@ from helpers import (
     jobs, jobs_lock,
     create_job as create_job_helper,
     update_job_progress as update_job_progress_helper,
-    update_job_status, add_job_segment, get_job,
+    update_job_status, add_job_segment, get_job, set_job_future,
+    get_cached_job_status, cache_job_status,
     allowed_file as allowed_file_helper
 )
 
-# Initialize video processor (lazy loading)
-video_processor = None
-
 
 def get_processor(use_sam=False):
     """Get or initialize the video processor"""
-    global video_processor
-
-    # Check if we need to reinitialize
-    need_reinit = False
-    if video_processor is None:
-        need_reinit = True
-        logger.info("No processor exists, will initialize new one")
-    elif hasattr(video_processor, 'use_sam') and video_processor.use_sam != use_sam:
-        need_reinit = True
-        logger.info(f"Processor SAM setting changed (current={video_processor.use_sam}, requested={use_sam}), will reinitialize")
-
-    if need_reinit:
-        logger.info(f"Initializing video processor with use_sam={use_sam}...")
-        video_processor = get_video_processor('yolo11n-seg.pt', use_sam=use_sam)
-        if use_sam:
-            logger.info("Video processor initialized with SAM refinement")
-        else:
-            logger.info("Video processor initialized (YOLO-only mode)")
-    else:
-        logger.info(f"Reusing existing processor (use_sam={video_processor.use_sam if hasattr(video_processor, 'use_sam') else 'unknown'})")
-
-    return video_processor
+    # Up to one YOLO model per concurrent job (filter previews have their
+    # own); the pool is shared by the SAM and YOLO-only processors
+    return get_video_processor(
+        'yolo11n-seg.pt',
+        use_sam=bool(use_sam),
+        model_pool_size=MAX_CONCURRENT_JOBS
+    )
+
+
+def warmup_processor():
+    """Load a warmed-up model now so the first real request skips it"""
+    try:
+        # Creating the processor loads its first pooled model, which runs a
+        # dummy inference as it is loaded
+        get_processor(use_sam=False)
+        logger.info("Video processor warmed up")
+    except Exception as e:
+        logger.warning(f"Processor warmup failed: {e}")
 
 
 # Wrapper functions for helpers with appropriate signatures
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return allowed_file_helper(filename, ALLOWED_EXTENSIONS)
+    return allowed_file_helper(filename, ALLOWED_SUFFIXES)
 
 
 def create_job(video_id, params):
@@ -119,19 +185,27 @@ config = {
     'PREVIEW_FOLDER': PREVIEW_FOLDER,
     'ALLOWED_EXTENSIONS': ALLOWED_EXTENSIONS,
     'MAX_FILE_SIZE': MAX_FILE_SIZE,
+    'MAX_CONCURRENT_JOBS': MAX_CONCURRENT_JOBS,
+    'MAX_QUEUED_JOBS': MAX_QUEUED_JOBS,
     'get_processor': get_processor,
     'allowed_file': allowed_file,
     'create_job': create_job,
     'update_job_status': update_job_status,
     'get_job': get_job,
+    'set_job_future': set_job_future,
+    'get_cached_job_status': get_cached_job_status,
+    'cache_job_status': cache_job_status,
     'process_video_background': process_video_background
 }
 
 register_routes(app, config)
 
+if os.getenv('WARMUP') == '1':
+    warmup_processor()
+
 
 if __name__ == "__main__":
     logger.info("Starting Overlap Video Processing Server")
     logger.info(f"Upload folder: {UPLOAD_FOLDER}")
     logger.info(f"Processed folder: {PROCESSED_FOLDER}")
-    app.run(host='0.0.0.0', port=8080, debug=True, use_reloader=True)
+    app.run(host='0.0.0.0', port=8080, debug=DEBUG, use_reloader=DEBUG)
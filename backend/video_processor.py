@@ -6,6 +6,8 @@ with optional SAM for pixel-perfect boundary refinement
 
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
 from ultralytics import YOLO
 import logging
 import os
@@ -13,6 +15,11 @@ from pathlib import Path
 import time
 import subprocess
 import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from queue import Queue, Empty, Full
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +32,442 @@ except ImportError:
     logger.warning("segment-anything not installed. SAM refinement will be disabled.")
 
 
+# Sepia color transform (BGR in, BGR out), float32 to match OpenCV's fast path
+SEPIA_KERNEL = np.array([[0.272, 0.534, 0.131],
+                         [0.349, 0.686, 0.168],
+                         [0.393, 0.769, 0.189]], dtype=np.float32)
+
+# Full-frame blur filter size. cv2.stackBlur (OpenCV 4.7+) runs in constant
+# time per pixel regardless of kernel size, unlike the 21-tap Gaussian.
+BLUR_KSIZE = (21, 21)
+STACK_BLUR_AVAILABLE = hasattr(cv2, 'stackBlur')
+# Separable Gaussian kernel for builds without stackBlur, built once at import
+BLUR_GAUSSIAN_KERNEL = cv2.getGaussianKernel(BLUR_KSIZE[0], 0)
+
+
+# Accelerator availability, queried once at import
+CUDA_AVAILABLE = torch.cuda.is_available()
+MPS_AVAILABLE = hasattr(torch.backends, 'mps') and torch.backends.mps.is_available()
+
+
+def configure_torch_backends():
+    """
+    Enable TF32 tensor-core math and cuDNN autotuning on CUDA devices
+
+    YOLO runs every frame of a video at the same input size, so cuDNN's
+    per-shape algorithm search is paid once per video. The flags are global
+    and idempotent; this is a no-op without CUDA.
+    """
+    if not CUDA_AVAILABLE:
+        return
+
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cudnn.benchmark = True
+    logger.info("Enabled TF32 and cuDNN benchmark mode for CUDA inference")
+
+
+# Build a TensorRT engine next to the .pt weights on CUDA machines that have
+# none yet. Takes minutes on first start; later starts load the cached file.
+EXPORT_TENSORRT_ENGINE = os.getenv('EXPORT_TENSORRT_ENGINE') == '1'
+
+# SAM image embeddings are reused while the scene holds still: up to this
+# many consecutive frames, while a 32x32 thumbnail differs from the embedded
+# frame's by less than the threshold (mean absolute difference, 0-255 scale)
+SAM_EMBEDDING_MAX_REUSE = 4
+SAM_SCENE_CHANGE_THRESHOLD = 2.0
+
+# Opt-in torch.compile of the YOLO network on CUDA (PyTorch 2.x). The first
+# batch of each new input shape pays the compile time.
+TORCH_COMPILE = os.getenv('TORCH_COMPILE') == '1'
+
+
+# Frames buffered between the decode, inference and encode stages
+PIPELINE_QUEUE_SIZE = 8
+# Frames per YOLO forward pass; batching amortizes per-call overhead on GPUs
+INFERENCE_BATCH_SIZE = int(os.getenv('INFERENCE_BATCH_SIZE', 8))
+# Run YOLO on every Nth frame and reuse the last person mask in between.
+# 1 keeps per-frame detection; 2-4 trade mask lag for proportionally less
+# inference on footage where people move slowly.
+INFERENCE_STRIDE = max(1, int(os.getenv('INFERENCE_STRIDE', 1)))
+# YOLO input size (long side, a multiple of 32). Frames are downscaled to it
+# on the decode thread, so inference never preprocesses full-resolution
+# frames itself. 416 or 512 cut inference cost roughly with the pixel count,
+# at some loss of mask detail on small or distant people.
+INFERENCE_IMGSZ = int(os.getenv('INFERENCE_IMGSZ', 640))
+# Optical flow for temporal mask smoothing runs on frames downscaled by this
+# factor and is upsampled back; the smoothed mask is soft, so 0.5 costs
+# little accuracy for ~4x less Farneback work. 1.0 uses full resolution.
+TEMPORAL_FLOW_SCALE = float(os.getenv('TEMPORAL_FLOW_SCALE', 0.5))
+# GrabCut refinement (aggressive mode) runs at this fraction of the frame
+# size and its mask is upsampled back; cost scales with the pixel count
+GRABCUT_SCALE = float(os.getenv('GRABCUT_SCALE', 0.5))
+# Hole filling, closing and lower-body extension of the person mask run at
+# this fraction of the frame size; the result is upsampled bilinearly
+MASK_GEOMETRY_SCALE = float(os.getenv('MASK_GEOMETRY_SCALE', 0.5))
+# libx264 preset for the output encode when NVENC is unavailable. The encode
+# runs alongside processing, so a fast preset keeps it off the critical path;
+# 'medium' gives smaller files at roughly twice the CPU time.
+X264_PRESET = os.getenv('X264_PRESET', 'veryfast')
+# Marks the end of a pipeline queue
+_END_OF_STREAM = object()
+
+
+def _queue_put(frame_queue, item, stop_event):
+    """
+    Put an item on a bounded queue unless the pipeline is stopped
+
+    Returns:
+        bool: True if queued, False if stop_event was set first
+    """
+    while not stop_event.is_set():
+        try:
+            frame_queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _queue_get(frame_queue, stop_event):
+    """
+    Get the next item from a pipeline queue
+
+    Returns:
+        The item, or _END_OF_STREAM if stop_event is set while waiting
+    """
+    while True:
+        try:
+            return frame_queue.get(timeout=0.1)
+        except Empty:
+            if stop_event.is_set():
+                return _END_OF_STREAM
+
+
+def _read_frames(cap, frame_queue, stop_event, errors, inference_size=None):
+    """
+    Decode frames into frame_queue, ending with _END_OF_STREAM
+
+    Items are (frame, model_input) pairs; model_input is the frame resized
+    to inference_size (width, height), or the frame itself when None.
+    """
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            model_input = frame
+            if inference_size is not None:
+                model_input = cv2.resize(frame, inference_size, interpolation=cv2.INTER_AREA)
+            if not _queue_put(frame_queue, (frame, model_input), stop_event):
+                break
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _queue_put(frame_queue, _END_OF_STREAM, stop_event)
+
+
+def _write_frames(out, frame_queue, stop_event, errors):
+    """Encode frames from frame_queue until _END_OF_STREAM or stop_event"""
+    try:
+        while True:
+            frame = _queue_get(frame_queue, stop_event)
+            if frame is _END_OF_STREAM:
+                return
+            out.write(frame)
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+
+
+def resolve_model_path(model_path, device):
+    """
+    Pick an exported inference engine for the device when one is present
+
+    Exports are looked up next to the .pt weights and are never built at
+    runtime; the .pt path is returned when no matching export exists.
+
+    Args:
+        model_path: Path to the YOLO .pt weights
+        device: Inference device ('cuda', 'mps' or 'cpu')
+
+    Returns:
+        str: Path to load with YOLO()
+    """
+    weights = Path(model_path)
+    if device == 'cuda':
+        engine = weights.with_suffix('.engine')
+        if engine.exists():
+            return str(engine)
+    elif device == 'cpu':
+        openvino_dir = weights.with_name(f'{weights.stem}_openvino_model')
+        if openvino_dir.is_dir():
+            return str(openvino_dir)
+    return str(model_path)
+
+
+def open_video_capture(video_path):
+    """
+    Open a video file for decoding with the FFmpeg backend
+
+    Hardware decoding (VAAPI, CUDA, D3D11, ...) is requested when the OpenCV
+    build supports it; OpenCV falls back to software decoding otherwise.
+
+    Args:
+        video_path: Path to the video file
+
+    Returns:
+        cv2.VideoCapture: Capture object (check isOpened())
+    """
+    return cv2.VideoCapture(
+        str(video_path),
+        cv2.CAP_FFMPEG,
+        [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    )
+
+
+def open_video_writer(video_path, fourcc, fps, frame_size):
+    """
+    Open a video file for encoding with the FFmpeg backend
+
+    Hardware encoding (NVENC, VAAPI, QSV, ...) is requested when the OpenCV
+    build supports it; OpenCV falls back to software encoding otherwise.
+
+    Args:
+        video_path: Path to the output video file
+        fourcc: FourCC codec code
+        fps: Output frame rate
+        frame_size: (width, height) of the frames to write
+
+    Returns:
+        cv2.VideoWriter: Writer object (check isOpened())
+    """
+    return cv2.VideoWriter(
+        str(video_path),
+        cv2.CAP_FFMPEG,
+        fourcc,
+        fps,
+        frame_size,
+        [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    )
+
+
+@lru_cache(maxsize=None)
+def _ffmpeg_encoders():
+    """
+    List the video encoders built into the ffmpeg on PATH
+
+    Returns:
+        frozenset: Encoder names (empty when ffmpeg is unavailable)
+    """
+    if not shutil.which('ffmpeg'):
+        return frozenset()
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return frozenset()
+
+    encoders = set()
+    for line in result.stdout.decode(errors='replace').splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and fields[0].startswith('V'):
+            encoders.add(fields[1])
+    return frozenset(encoders)
+
+
+def ffmpeg_video_codec_args(device):
+    """
+    Choose ffmpeg H.264 encoder arguments for the inference device
+
+    NVENC is used on CUDA machines whose ffmpeg was built with it, libx264
+    otherwise.
+
+    Args:
+        device: Inference device ('cuda', 'mps' or 'cpu')
+
+    Returns:
+        list: ffmpeg codec arguments, or None if no H.264 encoder is available
+    """
+    encoders = _ffmpeg_encoders()
+    if device == 'cuda' and 'h264_nvenc' in encoders:
+        return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-cq', '23']
+    if 'libx264' in encoders:
+        return ['-c:v', 'libx264', '-preset', X264_PRESET, '-crf', '23']
+    return None
+
+
+class FFmpegVideoWriter:
+    """
+    cv2.VideoWriter stand-in that pipes raw BGR frames into ffmpeg
+
+    Encodes browser-compatible H.264 and muxes the source audio in the same
+    pass, so the output never needs a second re-encode.
+    """
+
+    def __init__(self, output_path, frame_size, fps, codec_args, audio_source=None):
+        """
+        Start the ffmpeg encoder process
+
+        Args:
+            output_path: Path to the output video file
+            frame_size: (width, height) of the frames to write
+            fps: Output frame rate
+            codec_args: Video codec arguments from ffmpeg_video_codec_args()
+            audio_source: Optional video whose first audio stream is copied in
+        """
+        width, height = frame_size
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-'                              # Processed frames on stdin
+        ]
+        if audio_source:
+            cmd += ['-i', str(audio_source)]       # Original video (with audio)
+        cmd += ['-map', '0:v:0']
+        if audio_source:
+            cmd += [
+                '-map', '1:a:0?',                  # Original audio, if it exists
+                '-c:a', 'aac',                     # AAC audio codec (browser compatible)
+                '-b:a', '192k',
+                '-shortest'
+            ]
+        cmd += codec_args + [
+            '-pix_fmt', 'yuv420p',                 # Pixel format for compatibility
+            '-movflags', '+faststart',             # Enable streaming (moov atom at start)
+            str(output_path)
+        ]
+
+        # ffmpeg's error output goes to a file so a full pipe can never stall it
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr
+        )
+
+    def isOpened(self):
+        return self._process.poll() is None
+
+    def write(self, frame):
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self._process.wait()
+            raise RuntimeError(f"ffmpeg encoder exited early: {self._error_output()}")
+
+    def release(self):
+        """Finish encoding; raises RuntimeError if ffmpeg failed"""
+        if not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self._process.wait()
+        error_output = self._error_output()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg encoder failed ({returncode}): {error_output}")
+
+    def _error_output(self):
+        if self._stderr.closed:
+            return ''
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors='replace').strip()
+
+
+@lru_cache(maxsize=None)
+def structuring_element(shape, ksize):
+    """
+    Shared, cached cv2.getStructuringElement
+
+    Kernel sizes only depend on the frame size, so the same few elements
+    are requested on every frame. Callers must not modify the result.
+
+    Args:
+        shape: cv2.MORPH_* element shape
+        ksize: (width, height) tuple
+
+    Returns:
+        numpy.ndarray: uint8 structuring element
+    """
+    return cv2.getStructuringElement(shape, ksize)
+
+
+@lru_cache(maxsize=4)
+def pixel_grid(height, width):
+    """
+    Shared, cached (x, y) coordinate of every pixel
+
+    Args:
+        height: Grid height
+        width: Grid width
+
+    Returns:
+        numpy.ndarray: Read-only float32 array of shape (height, width, 2)
+    """
+    grid = np.empty((height, width, 2), dtype=np.float32)
+    grid[..., 0] = np.arange(width, dtype=np.float32)
+    grid[..., 1] = np.arange(height, dtype=np.float32)[:, None]
+    grid.flags.writeable = False
+    return grid
+
+
+def blur_frame(frame, dst=None):
+    """
+    Apply the 'blur' filter to a frame
+
+    Args:
+        frame: Input frame (BGR)
+        dst: Optional preallocated output buffer
+
+    Returns:
+        numpy.ndarray: Blurred frame
+    """
+    if STACK_BLUR_AVAILABLE:
+        return cv2.stackBlur(frame, BLUR_KSIZE, dst=dst)
+    return cv2.sepFilter2D(frame, -1, BLUR_GAUSSIAN_KERNEL, BLUR_GAUSSIAN_KERNEL, dst=dst)
+
+
+def apply_filter(frame, filter_type, dst=None):
+    """
+    Apply a specific filter to the entire frame
+
+    Shared by the video processor and the filter preview endpoint so both
+    render filters identically.
+
+    Args:
+        frame: Input frame (BGR)
+        filter_type: Type of filter ('grayscale', 'blur', 'sepia')
+        dst: Optional preallocated output buffer (same shape as frame)
+
+    Returns:
+        numpy.ndarray: Filtered frame (dst when given, unless the filter
+        type is unknown and the frame is returned unchanged)
+    """
+    if filter_type == 'grayscale':
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=dst)
+
+    elif filter_type == 'blur':
+        return blur_frame(frame, dst=dst)
+
+    elif filter_type == 'sepia':
+        # cv2.transform saturates uint8 output, so no clip/cast pass is needed
+        return cv2.transform(frame, SEPIA_KERNEL, dst=dst)
+
+    else:
+        # Unknown filter type, return original
+        logger.warning(f"Unknown filter type: {filter_type}, returning original frame")
+        return frame
+
+
 class LayoutTracker:
     """
     Stabilizes which layout/column should be processed so the grayscale region
@@ -188,12 +631,215 @@ class LayoutTracker:
 
 
 
+class YOLOModelPool:
+    """
+    Bounded, lazily filled pool of YOLO models loaded from one weights file
+
+    YOLO predictors are not thread-safe, so each user borrows a model for
+    the duration of its work. Models are only loaded when every existing
+    one is busy and the pool is below its size limit; otherwise borrowers
+    wait for a model to be returned.
+    """
+
+    def __init__(self, model_path, device, max_size, imgsz=None, half=False, compile_model=False):
+        """
+        Args:
+            model_path: Path to the YOLO .pt weights
+            device: Inference device ('cuda', 'mps' or 'cpu')
+            max_size: Most models the pool will load
+            imgsz: Input size the models are warmed up at (None for the
+                model's default)
+            half: Warm up (and so build the predictor) in FP16
+            compile_model: torch.compile each model on CUDA (TORCH_COMPILE)
+        """
+        self.device = device
+        self.max_size = max(1, max_size)
+        self._imgsz = imgsz
+        self._half = half
+        self._compile = compile_model
+
+        self.weights_path = str(model_path)
+        self._model_path = resolve_model_path(model_path, device)
+        if (EXPORT_TENSORRT_ENGINE and device == 'cuda'
+                and self._model_path == self.weights_path):
+            self._model_path = self._export_tensorrt_engine()
+        # Exported engines may be built for one input size only
+        self.is_exported_model = self._model_path != self.weights_path
+
+        self._idle = Queue()
+        self._size = 0
+        # Guards _size; loads are serialized so an export fallback happens once
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def predict_kwargs(self):
+        """Input size and precision arguments matching the warm-up prediction"""
+        kwargs = {'half': self._half}
+        if self._imgsz:
+            kwargs['imgsz'] = self._imgsz
+        return kwargs
+
+    def acquire(self):
+        """
+        Take a model, loading a new one if all are busy and the pool has room
+
+        Returns:
+            YOLO: Model for the caller's exclusive use until release()
+        """
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            can_load = self._size < self.max_size
+            if can_load:
+                self._size += 1
+        if not can_load:
+            return self._idle.get()
+
+        try:
+            with self._load_lock:
+                return self._load_model()
+        except BaseException:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def release(self, model):
+        """Return a model taken with acquire()"""
+        self._idle.put(model)
+
+    @contextmanager
+    def borrow(self):
+        """
+        Borrow a model for the duration of a with block
+
+        Yields:
+            YOLO: Model for the caller's exclusive use until the block exits
+        """
+        model = self.acquire()
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def _load_model(self):
+        """
+        Load and warm up a YOLO model instance from the resolved model path
+
+        Returns:
+            YOLO: Loaded model (compiled when enabled on CUDA)
+        """
+        try:
+            logger.info(f"Loading YOLOv11 model: {self._model_path}")
+            model = YOLO(self._model_path, task='segment')
+            logger.info("YOLOv11 model loaded successfully")
+        except Exception as e:
+            if not self.is_exported_model:
+                logger.error(f"Failed to load model: {e}")
+                raise
+            # A stale or incompatible export must not take the service down
+            logger.warning(f"Failed to load exported model, falling back to "
+                           f"{self.weights_path}: {e}")
+            self._model_path = self.weights_path
+            self.is_exported_model = False
+            return self._load_model()
+
+        self._warm_up_model(model)
+        if self._compile and self.device == 'cuda' and not self.is_exported_model:
+            self._compile_model(model)
+        return model
+
+    def _export_tensorrt_engine(self):
+        """
+        Export the .pt weights to an FP16 TensorRT engine saved next to them
+
+        Returns:
+            str: Path of the engine, or of the .pt weights if export failed
+        """
+        try:
+            logger.info(f"Exporting TensorRT engine from {self.weights_path} (this takes a few minutes)")
+            engine_path = YOLO(self.weights_path, task='segment').export(
+                format='engine',
+                half=True,
+                dynamic=True,
+                batch=INFERENCE_BATCH_SIZE,
+                imgsz=INFERENCE_IMGSZ
+            )
+            logger.info(f"TensorRT engine saved to {engine_path}")
+            return str(engine_path)
+        except Exception as e:
+            logger.warning(f"TensorRT export failed, using PyTorch weights: {e}")
+            return self.weights_path
+
+    def _warm_up_model(self, model):
+        """
+        Run one dummy prediction so the first real request skips model setup
+
+        YOLO builds its inference backend on the first predict call, with
+        the precision and input size used here.
+
+        Args:
+            model: Freshly loaded YOLO model
+        """
+        size = self._imgsz or INFERENCE_IMGSZ
+        try:
+            model.predict(
+                np.zeros((size, size, 3), dtype=np.uint8),
+                verbose=False,
+                device=self.device,
+                **self.predict_kwargs
+            )
+        except Exception as e:
+            logger.warning(f"YOLOv11 model warmup failed: {e}")
+
+    def _compile_model(self, model):
+        """
+        Compile the YOLO network with torch.compile, keeping eager mode on failure
+
+        The inference backend built by the warm-up prediction has its
+        network swapped for the compiled module.
+
+        Args:
+            model: Warmed-up YOLO model
+        """
+        try:
+            backend = model.predictor.model
+            backend.model = torch.compile(backend.model, mode='reduce-overhead')
+            logger.info("Compiled YOLOv11 model with torch.compile")
+        except Exception as e:
+            logger.warning(f"torch.compile failed, using eager model: {e}")
+
+
+class _ThreadState(threading.local):
+    """
+    Per-thread processor state
+
+    One cached processor serves every concurrent job, each on its own
+    executor thread, so temporal smoothing state must not leak between
+    videos. YOLO models are not per-thread; jobs borrow them from the
+    processor's pool.
+    """
+
+    def __init__(self):
+        self.prev_mask = None
+        self.prev_gray = None
+        self.missing_person_frames = 0
+        # GrabCut colour models, carried over between frames of one video
+        self.grabcut_bgd_model = np.zeros((1, 65), np.float64)
+        self.grabcut_fgd_model = np.zeros((1, 65), np.float64)
+        self.grabcut_initialized = False
+
+
 class VideoProcessor:
     """
     Video processor using YOLOv11-seg for person detection and optional SAM for refinement
     """
 
-    def __init__(self, model_path='yolo11n-seg.pt', use_sam=False, sam_model_type='vit_b', sam_checkpoint=None):
+    def __init__(self, model_path='yolo11n-seg.pt', use_sam=False, sam_model_type='vit_b', sam_checkpoint=None,
+                 model_pool_size=1):
         """
         Initialize the video processor with YOLOv11 segmentation model and optional SAM
 
@@ -202,15 +848,28 @@ class VideoProcessor:
             use_sam: Enable SAM refinement for pixel-perfect boundaries
             sam_model_type: SAM model type ('vit_b', 'vit_l', 'vit_h')
             sam_checkpoint: Path to SAM checkpoint file (auto-detects if None)
+            model_pool_size: Most YOLO models to load for the shared pool, i.e.
+                how many jobs can run inference at the same time
         """
-        # Load YOLO
-        try:
-            logger.info(f"Loading YOLOv11 model: {model_path}")
-            self.model = YOLO(model_path)
-            logger.info("YOLOv11 model loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load model: {e}")
-            raise
+        configure_torch_backends()
+        # Resolved once; the device cannot change while the process runs
+        self._device = self._detect_device()
+
+        self._state = _ThreadState()
+
+        # YOLO predictors are not thread-safe, so jobs borrow models from a
+        # bounded pool shared by every processor using these weights. One
+        # model is loaded now so a bad model fails early; the rest are only
+        # loaded when concurrent jobs need them.
+        self._models = get_model_pool(
+            model_path,
+            self._get_device(),
+            model_pool_size,
+            imgsz=INFERENCE_IMGSZ,
+            compile_model=TORCH_COMPILE
+        )
+        with self._models.borrow():
+            pass
 
         # Optionally load SAM
         self.use_sam = use_sam and SAM_AVAILABLE
@@ -242,9 +901,53 @@ class VideoProcessor:
                     logger.warning("Falling back to YOLO-only mode")
                     self.use_sam = False
 
-        self._prev_mask = None
-        self._prev_gray = None
-        self._missing_person_frames = 0
+        # SamPredictor keeps the current image's embedding between calls
+        self._sam_lock = threading.Lock()
+        # Shape and thumbnail of the frame behind the current embedding, and
+        # how many frames have reused it; guarded by _sam_lock
+        self._sam_image_shape = None
+        self._sam_signature = None
+        self._sam_reuse_count = 0
+        # Per-thread scratch buffers: one processor serves concurrent jobs
+        self._scratch = threading.local()
+
+    @property
+    def is_exported_model(self):
+        """Whether the YOLO models load an exported engine (may be built for one input size)"""
+        return self._models.is_exported_model
+
+    def borrow_model(self):
+        """
+        Borrow a YOLO model from the shared pool, waiting while all are in use
+
+        Returns:
+            Context manager yielding a model for the caller's exclusive use
+        """
+        return self._models.borrow()
+
+    def preview_model_pool(self, imgsz):
+        """
+        Single-model pool for still-image previews
+
+        The preview model is warmed up at its own input size, and in FP16 on
+        CUDA, so previews never change the input size or precision the
+        video jobs' models were built and compiled for.
+
+        Args:
+            imgsz: Preview input size (exported engines keep their own)
+
+        Returns:
+            YOLOModelPool: Pool to borrow the preview model from; pass its
+            predict_kwargs to predict()
+        """
+        device = self._get_device()
+        return get_model_pool(
+            self._models.weights_path,
+            device,
+            1,
+            imgsz=None if self.is_exported_model else imgsz,
+            half=device == 'cuda'
+        )
 
     def process_video_selective_filter(
         self,
@@ -270,7 +973,8 @@ class VideoProcessor:
             no_person_behavior: What to do when no person detected
                                ('keep_original' or 'apply_filter')
             confidence_threshold: Confidence threshold for person detection (0.0-1.0)
-            progress_callback: Optional callback function for progress updates
+            progress_callback: Optional callback function for progress updates, called as
+                               callback(percent, current, total, preview_frame=output_frame)
             region_aware: If True, only process the column/region where person appears
             roi_expansion: How much to expand the person's bounding box to define region (0.3 = 30%)
             boundary_refinement: Boundary refinement level ('minimal', 'balanced', 'aggressive')
@@ -288,7 +992,7 @@ class VideoProcessor:
             raise FileNotFoundError(f"Input video not found: {input_video_path}")
 
         # Open video capture
-        cap = cv2.VideoCapture(input_video_path)
+        cap = open_video_capture(input_video_path)
         if not cap.isOpened():
             raise ValueError(f"Could not open video: {input_video_path}")
 
@@ -306,15 +1010,25 @@ class VideoProcessor:
             os.makedirs(output_dir, exist_ok=True)
 
         # Video writer - Use H.264 codec for browser compatibility
-        # Try avc1 first (H.264), fallback to mp4v if not available
-        fourcc = cv2.VideoWriter_fourcc(*'avc1')
-        out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
-
-        # If avc1 fails, try H264
-        if not out.isOpened():
-            logger.warning("avc1 codec not available, trying H264")
-            fourcc = cv2.VideoWriter_fourcc(*'H264')
-            out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+        # Prefer piping frames to ffmpeg, which also carries over the audio
+        codec_args = ffmpeg_video_codec_args(self._get_device())
+        if codec_args:
+            out = FFmpegVideoWriter(
+                output_video_path, (width, height), fps, codec_args,
+                audio_source=input_video_path
+            )
+        else:
+            logger.warning("ffmpeg with an H.264 encoder not found, writing with OpenCV "
+                           "(no audio, may not play in every browser)")
+            # Try avc1 first (H.264), fallback to H264 if not available
+            fourcc = cv2.VideoWriter_fourcc(*'avc1')
+            out = open_video_writer(output_video_path, fourcc, fps, (width, height))
+
+            # If avc1 fails, try H264
+            if not out.isOpened():
+                logger.warning("avc1 codec not available, trying H264")
+                fourcc = cv2.VideoWriter_fourcc(*'H264')
+                out = open_video_writer(output_video_path, fourcc, fps, (width, height))
 
         if not out.isOpened():
             raise ValueError(f"Could not create output video: {output_video_path}")
@@ -326,81 +1040,166 @@ class VideoProcessor:
         layout_tracker = LayoutTracker(width, height)
         self._reset_temporal_state()
 
-        try:
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
+        # Frames larger than the YOLO input are downscaled before inference;
+        # masks are resized back to full resolution for compositing
+        inference_scale = INFERENCE_IMGSZ / max(width, height, 1)
+        inference_size = None
+        if inference_scale < 1:
+            inference_size = (round(width * inference_scale), round(height * inference_scale))
+
+        # Decode and encode run on their own threads so they overlap with
+        # inference on the current frame; bounded queues cap the frames held
+        read_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        write_queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stop_event = threading.Event()
+        pipeline_errors = []
+        reader = threading.Thread(
+            target=_read_frames,
+            args=(cap, read_queue, stop_event, pipeline_errors, inference_size),
+            name='video-decode', daemon=True
+        )
+        writer = threading.Thread(
+            target=_write_frames, args=(out, write_queue, stop_event, pipeline_errors),
+            name='video-encode', daemon=True
+        )
+        reader.start()
+        writer.start()
 
-                frame_count += 1
-
-                # Run YOLOv11 inference
-                inference_start = time.time()
-                device = self._get_device()
-                results = self.model.predict(
-                    frame,
-                    classes=[0],  # class 0 = person in COCO dataset
-                    conf=confidence_threshold,
-                    verbose=False,
-                    device=device
-                )
-                inference_time = time.time() - inference_start
-                total_inference_time += inference_time
+        device = self._get_device()
+        # Person mask (and count) from the last frame YOLO ran on, reused
+        # for the frames skipped by INFERENCE_STRIDE
+        last_person_mask = None
+        last_num_people = 0
+        # Borrowed for the whole video and returned in the finally below
+        model = self._models.acquire()
+        failed = False
 
-                # Check if person detected
-                if results[0].masks is not None and len(results[0].masks) > 0:
-                    frames_with_person += 1
-                    num_people = len(results[0].masks)
-                    layout_tracker.register_detection()
-                    self._missing_person_frames = 0
+        try:
+            end_of_stream = False
+            while not end_of_stream:
+                # Collect up to INFERENCE_BATCH_SIZE decoded (frame, model_input) pairs
+                batch = []
+                while len(batch) < INFERENCE_BATCH_SIZE:
+                    item = _queue_get(read_queue, stop_event)
+                    if item is _END_OF_STREAM:
+                        end_of_stream = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
 
-                    # Log detection details periodically
-                    if frame_count % 100 == 0:
-                        logger.info(f"Frame {frame_count}: Detected {num_people} person(s), "
-                                  f"applying {filter_type} to {apply_to}")
-
-                    # Apply selective filter with region awareness
-                    output_frame = self._apply_selective_filter(
-                        frame,
-                        results[0].masks.data.cpu().numpy(),
-                        filter_type,
-                        apply_to,
-                        region_aware=region_aware,
-                        roi_expansion=roi_expansion,
-                        layout_tracker=layout_tracker,
-                        boundary_refinement=boundary_refinement
+                # Run YOLOv11 inference on the batch's strided frames in one forward pass
+                infer_indices = [
+                    i for i in range(len(batch))
+                    if (frame_count + i) % INFERENCE_STRIDE == 0
+                ]
+                batch_results = {}
+                if infer_indices:
+                    inference_start = time.time()
+                    predictions = model.predict(
+                        [batch[i][1] for i in infer_indices],
+                        classes=[0],  # class 0 = person in COCO dataset
+                        conf=confidence_threshold,
+                        verbose=False,
+                        device=device,
+                        imgsz=INFERENCE_IMGSZ
                     )
-                else:
-                    layout_tracker.register_no_person()
-                    self._missing_person_frames += 1
-                    if self._missing_person_frames >= 6:
-                        self._reset_temporal_state()
-                    # No person detected - keep frame unchanged by default
-                    if no_person_behavior == 'keep_original':
-                        output_frame = frame
+                    inference_time = time.time() - inference_start
+                    total_inference_time += inference_time
+                    batch_results = dict(zip(infer_indices, predictions))
+
+                # Composite and queue each frame in order; temporal smoothing
+                # state still advances one frame at a time
+                for i, (frame, _) in enumerate(batch):
+                    frame_count += 1
+
+                    result = batch_results.get(i)
+                    if result is not None:
+                        last_person_mask = None
+                        last_num_people = 0
+                        if result.masks is not None and len(result.masks) > 0:
+                            last_person_mask = self.merge_person_masks(
+                                result.masks.data, frame.shape[0], frame.shape[1]
+                            )
+                            last_num_people = len(result.masks)
+
+                    # Check if person detected
+                    if last_person_mask is not None:
+                        frames_with_person += 1
+                        num_people = last_num_people
+                        layout_tracker.register_detection()
+                        self._state.missing_person_frames = 0
+
+                        # Log detection details periodically
                         if frame_count % 100 == 0:
-                            logger.info(f"Frame {frame_count}: No person detected, keeping original")
-                    else:  # apply_filter to entire frame
-                        output_frame = self._apply_filter(frame, filter_type)
-                        if frame_count % 100 == 0:
-                            logger.info(f"Frame {frame_count}: No person detected, applying full filter")
-
-                # Write processed frame
-                out.write(output_frame)
-
-                # Progress callback
-                if progress_callback and frame_count % 30 == 0:  # Update every 30 frames
-                    progress = (frame_count / total_frames) * 100
-                    progress_callback(progress, frame_count, total_frames)
-
-                # Log progress periodically
-                if frame_count % 100 == 0:
-                    logger.info(f"Processed {frame_count}/{total_frames} frames "
-                              f"({(frame_count/total_frames)*100:.1f}%)")
-
+                            logger.info(f"Frame {frame_count}: Detected {num_people} person(s), "
+                                      f"applying {filter_type} to {apply_to}")
+
+                        # Apply selective filter with region awareness
+                        output_frame = self._apply_selective_filter(
+                            frame,
+                            last_person_mask,
+                            filter_type,
+                            apply_to,
+                            region_aware=region_aware,
+                            roi_expansion=roi_expansion,
+                            layout_tracker=layout_tracker,
+                            boundary_refinement=boundary_refinement
+                        )
+                    else:
+                        layout_tracker.register_no_person()
+                        self._state.missing_person_frames += 1
+                        if self._state.missing_person_frames >= 6:
+                            self._reset_temporal_state()
+                        # No person detected - keep frame unchanged by default
+                        if no_person_behavior == 'keep_original':
+                            output_frame = frame
+                            if frame_count % 100 == 0:
+                                logger.info(f"Frame {frame_count}: No person detected, keeping original")
+                        else:  # apply_filter to entire frame
+                            output_frame = self._apply_filter(frame, filter_type)
+                            if frame_count % 100 == 0:
+                                logger.info(f"Frame {frame_count}: No person detected, applying full filter")
+
+                    # Hand the processed frame to the encoder thread
+                    if not _queue_put(write_queue, output_frame, stop_event):
+                        end_of_stream = True
+                        break
+
+                    # Progress callback
+                    if progress_callback and frame_count % 30 == 0:  # Update every 30 frames
+                        progress = (frame_count / total_frames) * 100
+                        progress_callback(progress, frame_count, total_frames, preview_frame=output_frame)
+
+                    # Log progress periodically
+                    if frame_count % 100 == 0:
+                        logger.info(f"Processed {frame_count}/{total_frames} frames "
+                                  f"({(frame_count/total_frames)*100:.1f}%)")
+
+            # Let the writer drain everything queued before it
+            _queue_put(write_queue, _END_OF_STREAM, stop_event)
+        except BaseException:
+            failed = True
+            stop_event.set()
+            raise
         finally:
+            self._models.release(model)
+            # Stages exit on _END_OF_STREAM, or promptly once stop_event is set
+            writer.join()
+            stop_event.set()
+            reader.join()
             cap.release()
-            out.release()
+            if failed or pipeline_errors:
+                # Closing the encoder may fail too; keep the original error
+                try:
+                    out.release()
+                except Exception as e:
+                    logger.warning(f"Failed to close video writer after an error: {e}")
+            else:
+                out.release()
+
+        if pipeline_errors:
+            raise pipeline_errors[0]
 
         # Calculate statistics
         processing_time = time.time() - start_time
@@ -440,57 +1239,34 @@ class VideoProcessor:
         logger.info(f"Person detected in {frames_with_person}/{frame_count} frames "
                    f"({detection_rate:.1f}%)")
 
-        # Re-encode with ffmpeg and add audio from original video
-        try:
-            self._reencode_with_audio(input_video_path, output_video_path)
-        except Exception as e:
-            logger.warning(f"FFmpeg re-encoding with audio failed: {e}")
-            # Try without audio as fallback
-            try:
-                self._reencode_with_ffmpeg(output_video_path)
-            except Exception as e2:
-                logger.warning(f"FFmpeg re-encoding failed, video may have compatibility issues: {e2}")
-
         return stats
 
-    def _calculate_expanded_region(self, masks, frame_shape, expansion=0.3, layout_tracker=None):
+    def _calculate_expanded_region(self, person_mask, frame_shape, expansion=0.3, layout_tracker=None):
         """
         Calculate expanded region/column where person appears
         Intelligently adapts based on how much of the frame the person occupies
 
         Args:
-            masks: Person segmentation masks
+            person_mask: Merged person segmentation mask at frame size
             frame_shape: Frame dimensions (height, width, channels)
             expansion: How much to expand beyond person (0.3 = 30% on each side)
             layout_tracker: Optional tracker to lock layout columns over time
 
         Returns:
-            numpy.ndarray: Region mask (1.0 in region to process, 0.0 elsewhere), or None for full frame
+            tuple: (row slice, column slice) of the rectangular region to
+            process, or None for full frame
         """
         height, width = frame_shape[:2]
         frame_area = height * width
 
-        # Find bounding box of all people
-        min_x, min_y = width, height
-        max_x, max_y = 0, 0
-
-        for mask in masks:
-            mask_resized = cv2.resize(mask, (width, height))
-            mask_binary = (mask_resized > 0.5).astype(np.uint8)
-
-            # Find contours
-            contours, _ = cv2.findContours(mask_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            for contour in contours:
-                x, y, w, h = cv2.boundingRect(contour)
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
-                max_x = max(max_x, x + w)
-                max_y = max(max_y, y + h)
+        # Find bounding box of all people - the bounding box of the merged
+        # mask's non-zero pixels covers every person's contours
+        mask_binary = (person_mask > 0.5).astype(np.uint8)
+        min_x, min_y, bbox_width, bbox_height = cv2.boundingRect(mask_binary)
+        max_x = min_x + bbox_width
+        max_y = min_y + bbox_height
 
         # Calculate bounding box dimensions
-        bbox_width = max_x - min_x
-        bbox_height = max_y - min_y
         bbox_area = bbox_width * bbox_height
         width_ratio = bbox_width / width if width else 0
 
@@ -554,12 +1330,8 @@ class VideoProcessor:
 
             logger.debug("Person centered - using expanded rectangular region")
 
-        # Create region mask
-        region_mask = np.zeros((height, width), dtype=np.float32)
-        region_mask[region_y1:region_y2, region_x1:region_x2] = 1.0
-
         logger.debug(f"Person occupies {area_ratio*100:.1f}% of frame - region: [{region_x1}:{region_x2}, {region_y1}:{region_y2}]")
-        return region_mask
+        return np.s_[region_y1:region_y2, region_x1:region_x2]
 
     def _refine_mask_with_sam(self, frame, yolo_mask):
         """
@@ -577,12 +1349,6 @@ class VideoProcessor:
             return yolo_mask
 
         try:
-            # Convert BGR to RGB for SAM
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            # Set image for SAM
-            self.sam_predictor.set_image(frame_rgb)
-
             # Get bounding box from YOLO mask
             mask_binary = (yolo_mask > 0.5).astype(np.uint8)
             contours, _ = cv2.findContours(mask_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -606,12 +1372,35 @@ class VideoProcessor:
             # Use YOLO mask as additional hint (downsampled to 256x256 for SAM)
             mask_hint = cv2.resize(yolo_mask, (256, 256))
 
-            # Run SAM prediction with both box and mask hints
-            refined_masks, scores, _ = self.sam_predictor.predict(
-                box=box,
-                mask_input=mask_hint[None, :, :],
-                multimask_output=False  # Single best mask
-            )
+            # Cheap scene signature to decide whether the embedding can be reused
+            signature = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+            # The predictor is shared across jobs; hold it from set_image
+            # until the prediction for that image is done
+            with self._sam_lock:
+                if (
+                    self._sam_image_shape == frame.shape and
+                    self._sam_reuse_count < SAM_EMBEDDING_MAX_REUSE and
+                    cv2.norm(signature, self._sam_signature, cv2.NORM_L1) / signature.size
+                    < SAM_SCENE_CHANGE_THRESHOLD
+                ):
+                    # Near-identical frame: skip the ViT encoder, only the
+                    # prompt/mask decoder runs below
+                    self._sam_reuse_count += 1
+                else:
+                    # SAM flips BGR input with a channel view on its way into
+                    # its own resize, so no separate RGB copy is made here
+                    self.sam_predictor.set_image(frame, image_format='BGR')
+                    self._sam_image_shape = frame.shape
+                    self._sam_signature = signature
+                    self._sam_reuse_count = 0
+
+                # Run SAM prediction with both box and mask hints
+                refined_masks, scores, _ = self.sam_predictor.predict(
+                    box=box,
+                    mask_input=mask_hint[None, :, :],
+                    multimask_output=False  # Single best mask
+                )
 
             # Resize refined mask back to frame size
             refined_mask = cv2.resize(
@@ -626,7 +1415,7 @@ class VideoProcessor:
             logger.warning(f"SAM refinement failed: {e}. Using YOLO mask.")
             return yolo_mask
 
-    def _apply_selective_filter(self, frame, masks, filter_type, apply_to,
+    def _apply_selective_filter(self, frame, yolo_mask, filter_type, apply_to,
                                region_aware=True, roi_expansion=0.3,
                                layout_tracker=None, boundary_refinement='balanced'):
         """
@@ -640,7 +1429,8 @@ class VideoProcessor:
 
         Args:
             frame: Input frame (BGR)
-            masks: Person segmentation masks from YOLO (pixel-perfect person detection)
+            yolo_mask: Merged person segmentation mask from YOLO at frame size
+                       (pixel-perfect person detection, see merge_person_masks)
             filter_type: Type of filter to apply
             apply_to: 'background' or 'person'
             region_aware: If True, only process region where person detected
@@ -651,12 +1441,9 @@ class VideoProcessor:
         Returns:
             numpy.ndarray: Processed frame
         """
-        # Combine all person masks - this is PIXEL-PERFECT segmentation from YOLO
+        # Combined person mask - this is PIXEL-PERFECT segmentation from YOLO
         # It follows the exact contours of the person, including spaces between arms/body
-        combined_mask = np.zeros(frame.shape[:2], dtype=np.float32)
-        for mask in masks:
-            mask_resized = cv2.resize(mask, (frame.shape[1], frame.shape[0]))
-            combined_mask = np.maximum(combined_mask, mask_resized)
+        combined_mask = yolo_mask
 
         # HYBRID YOLO+SAM: If SAM is enabled, use it for pixel-perfect refinement
         if self.use_sam and self.sam_predictor is not None:
@@ -682,7 +1469,7 @@ class VideoProcessor:
                 kernel_size = max(9, int(min_dim * 0.03))
                 if kernel_size % 2 == 0:
                     kernel_size += 1
-                kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+                kernel = structuring_element(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
                 mask_refined = cv2.morphologyEx(mask_binary, cv2.MORPH_CLOSE, kernel)
 
                 # Apply aggressive geometric enhancement
@@ -708,20 +1495,16 @@ class VideoProcessor:
                 # Very slight blur to soften hard edges (3x3 instead of 5x5)
                 combined_mask = cv2.GaussianBlur(combined_mask, (3, 3), 0)
 
-        # Calculate region mask if region-aware mode is enabled
-        region_mask = None
+        # Calculate processing region if region-aware mode is enabled
+        region = None
         if region_aware:
-            region_mask = self._calculate_expanded_region(
-                masks,
+            region = self._calculate_expanded_region(
+                yolo_mask,
                 frame.shape,
                 roi_expansion,
                 layout_tracker=layout_tracker
             )
 
-        # If no region mask (None), it means process entire frame
-        if region_mask is None:
-            region_mask = np.ones(frame.shape[:2], dtype=np.float32)
-
         # Determine base masks using ACTUAL person segmentation
         if apply_to == 'background':
             # We want to filter background, keep person in color
@@ -733,38 +1516,80 @@ class VideoProcessor:
             person_mask = 1 - combined_mask
             background_mask = combined_mask
 
-        # Apply region constraint
-        # CRITICAL FIX: Only filter background pixels that are within the processing region
-        # Formula breakdown:
-        # - background_mask: All background pixels (0.0 = not background, 1.0 = background)
-        # - region_mask: Processing region (0.0 = don't process, 1.0 = process)
-        # - background_mask * region_mask: Background pixels within processing region only
-        filter_mask = background_mask * region_mask
-
-        # CRITICAL FIX: Keep person pixels everywhere + keep all pixels outside region
-        # Formula breakdown:
-        # - person_mask: Person pixels (1.0 = person, 0.0 = not person)
-        # - (1 - region_mask): Pixels outside processing region
-        # - (1 - person_mask): Non-person pixels
-        # - (1 - region_mask) * (1 - person_mask): Background pixels outside region
-        # Final: person_mask + (1 - region_mask) = person + everything outside region
-        keep_mask = person_mask + (1 - region_mask)
+        if region is None:
+            # No region means process the entire frame
+            filter_mask = background_mask
+            keep_mask = person_mask
+        else:
+            # Apply region constraint. The region is a rectangle, so the masks
+            # are built by writing into it rather than by full-frame products
+            # with a 0/1 region mask:
+            # - filter_mask: background pixels within the processing region only
+            # - keep_mask: person pixels inside the region + everything outside it
+            filter_mask = self._scratch_buffer('filter_mask', background_mask.shape, background_mask.dtype)
+            filter_mask.fill(0)
+            filter_mask[region] = background_mask[region]
+
+            keep_mask = self._scratch_buffer('keep_mask', person_mask.shape, person_mask.dtype)
+            keep_mask.fill(1)
+            keep_mask[region] = person_mask[region]
 
         # Ensure masks sum to 1.0 for proper compositing
         # This prevents double-darkening or over-brightening
-        keep_mask = np.clip(keep_mask, 0, 1)
-        filter_mask = np.clip(filter_mask, 0, 1)
-
-        # Apply filter to entire frame
-        filtered_frame = self._apply_filter(frame, filter_type)
+        # Clipped in place; the only arrays they can alias are YOLO masks,
+        # which are already within [0, 1] and so are left unchanged
+        np.clip(keep_mask, 0, 1, out=keep_mask)
+        np.clip(filter_mask, 0, 1, out=filter_mask)
+
+        # Nothing to filter (e.g. the mask covers the whole region): keep_mask
+        # is 1.0 everywhere, so the composite would reproduce the frame exactly
+        if cv2.countNonZero(filter_mask) == 0:
+            return frame
 
-        # Create 3-channel masks for compositing
-        filter_mask_3ch = np.stack([filter_mask] * 3, axis=-1)
-        keep_mask_3ch = np.stack([keep_mask] * 3, axis=-1)
+        # Nothing to keep (e.g. person mode with the person filling the
+        # frame): the blend would reproduce the filtered frame exactly
+        if cv2.countNonZero(keep_mask) == 0:
+            return apply_filter(frame, filter_type)
+
+        # Only pixels inside the filter mask's bounding box receive filtered
+        # output, so the filter runs on that box alone. The margin gives the
+        # blur the same neighbourhood it has in a full-frame pass.
+        keep_mask = keep_mask.astype(np.float32, copy=False)
+        filter_mask = filter_mask.astype(np.float32, copy=False)
+        height, width = frame.shape[:2]
+        x, y, w, h = cv2.boundingRect((filter_mask > 0).view(np.uint8))
+        margin = BLUR_KSIZE[0] // 2
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        x1, y1 = min(width, x + w + margin), min(height, y + h + margin)
+        roi = np.s_[y0:y1, x0:x1]
+
+        # Pixels outside the box are kept as-is, so they start as a copy
+        if (x1 - x0, y1 - y0) == (width, height):
+            output = np.empty_like(frame)
+        else:
+            output = frame.copy()
+
+        # Filter into a reused buffer - the filtered pixels only live until
+        # the blend below. The box is carved contiguously from the front of
+        # a frame-sized buffer; stackBlur mishandles strided dst views.
+        box_shape = (y1 - y0, x1 - x0, frame.shape[2])
+        filtered_buffer = self._scratch_buffer('filtered', frame.shape).reshape(-1)
+        filtered_frame = apply_filter(
+            frame[roi], filter_type,
+            dst=filtered_buffer[:np.prod(box_shape)].reshape(box_shape)
+        )
 
         # Composite result using proper alpha blending
         # output = original_pixels_we_keep + filtered_pixels_we_apply
-        output = (frame * keep_mask_3ch + filtered_frame * filter_mask_3ch).astype(np.uint8)
+        # blendLinear weights per pixel straight from the single-channel
+        # masks, so there are no 3-channel float copies of the frame
+        cv2.blendLinear(
+            frame[roi],
+            filtered_frame,
+            keep_mask[roi],
+            filter_mask[roi],
+            dst=output[roi]
+        )
 
         return output
 
@@ -783,43 +1608,56 @@ class VideoProcessor:
         if np.count_nonzero(mask_binary) < 10:
             return mask.astype(np.float32)
 
-        # TUNED: Reduced from (9,9) to (5,5) and (21,21) to (11,11) for gentler refinement
-        fg_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        bg_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (11, 11))
+        # GrabCut runs on a downscaled frame; the kernels shrink with it so
+        # the sure-foreground/background bands keep their width in the picture
+        height, width = mask_binary.shape
+        scale = GRABCUT_SCALE
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            mask_binary = cv2.resize(
+                mask_binary,
+                (frame.shape[1], frame.shape[0]),
+                interpolation=cv2.INTER_NEAREST
+            )
 
-        sure_fg = cv2.erode(mask_binary, fg_kernel, iterations=1)
-        sure_bg = cv2.dilate(1 - mask_binary, bg_kernel, iterations=1)
+        # TUNED: Reduced from (9,9) to (5,5) and (21,21) to (11,11) for gentler refinement
+        sure_fg = self._iter_morph(mask_binary, cv2.MORPH_ERODE, max(3, int(5 * scale) | 1))
+        sure_bg = self._iter_morph(1 - mask_binary, cv2.MORPH_DILATE, max(3, int(11 * scale) | 1))
 
         grabcut_mask = np.full(mask_binary.shape, cv2.GC_PR_BGD, dtype=np.uint8)
         grabcut_mask[mask_binary == 1] = cv2.GC_PR_FGD
         grabcut_mask[sure_fg == 1] = cv2.GC_FGD
         grabcut_mask[sure_bg == 1] = cv2.GC_BGD
 
-        bgd_model = np.zeros((1, 65), np.float64)
-        fgd_model = np.zeros((1, 65), np.float64)
+        # Consecutive frames share colours, so after the first frame the
+        # previous frame's models seed GrabCut instead of a k-means init
+        state = self._state
+        mode = cv2.GC_EVAL if state.grabcut_initialized else cv2.GC_INIT_WITH_MASK
 
         try:
             cv2.grabCut(
                 frame,
                 grabcut_mask,
                 None,
-                bgd_model,
-                fgd_model,
+                state.grabcut_bgd_model,
+                state.grabcut_fgd_model,
                 1,
-                cv2.GC_INIT_WITH_MASK
+                mode
             )
         except cv2.error as err:
+            state.grabcut_initialized = False
             logger.debug(f"GrabCut refinement skipped due to OpenCV error: {err}")
             return mask.astype(np.float32)
         except Exception as err:
+            state.grabcut_initialized = False
             logger.debug(f"GrabCut refinement skipped: {err}")
             return mask.astype(np.float32)
+        state.grabcut_initialized = True
 
-        refined = np.where(
-            (grabcut_mask == cv2.GC_FGD) | (grabcut_mask == cv2.GC_PR_FGD),
-            1.0,
-            0.0
-        ).astype(np.float32)
+        # GC_FGD (1) and GC_PR_FGD (3) are the labels with bit 0 set
+        refined = (grabcut_mask & 1).astype(np.float32)
+        if refined.shape != (height, width):
+            refined = cv2.resize(refined, (width, height), interpolation=cv2.INTER_LINEAR)
 
         return refined
 
@@ -834,9 +1672,11 @@ class VideoProcessor:
         if mask is None:
             return mask
 
+        output_shape = mask.shape
+        mask, frame_shape = self._downscale_mask(mask, frame_shape)
         enhanced = (mask > 0).astype(np.uint8)
         if np.count_nonzero(enhanced) == 0:
-            return enhanced.astype(np.float32)
+            return np.zeros(output_shape, dtype=np.float32)
 
         # Fill holes aggressively
         enhanced = self._fill_mask_holes(enhanced)
@@ -845,7 +1685,9 @@ class VideoProcessor:
         contours, _ = cv2.findContours(enhanced, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         hull_mask = np.zeros_like(enhanced)
         frame_area = frame_shape[0] * frame_shape[1]
-        min_contour_area = max(300, frame_area // 1000)
+        # Fixed pixel limits are given at full resolution and scaled to the
+        # downscaled mask, like the frame-relative ones
+        min_contour_area = max(300 * MASK_GEOMETRY_SCALE ** 2, frame_area // 1000)
 
         for contour in contours:
             if cv2.contourArea(contour) < min_contour_area:
@@ -857,13 +1699,17 @@ class VideoProcessor:
 
         # Strong morphological closing
         min_dim = min(frame_shape[:2])
-        close_kernel = self._build_ellipse_kernel(min_dim, 0.05, min_size=11, max_size=61)
-        enhanced = cv2.morphologyEx(enhanced, cv2.MORPH_CLOSE, close_kernel)
+        close_size = self._ellipse_kernel_size(
+            min_dim, 0.05,
+            min_size=11 * MASK_GEOMETRY_SCALE,
+            max_size=61 * MASK_GEOMETRY_SCALE
+        )
+        enhanced = self._iter_morph(enhanced, cv2.MORPH_CLOSE, close_size)
 
         # Aggressive lower mask extension
         enhanced = self._extend_lower_mask_aggressive(enhanced)
 
-        return enhanced.astype(np.float32)
+        return self._upscale_mask(enhanced, output_shape)
 
     def _enhance_person_mask_geometry(self, mask, frame_shape):
         """
@@ -877,9 +1723,11 @@ class VideoProcessor:
         if mask is None:
             return mask
 
+        output_shape = mask.shape
+        mask, frame_shape = self._downscale_mask(mask, frame_shape)
         enhanced = (mask > 0).astype(np.uint8)
         if np.count_nonzero(enhanced) == 0:
-            return enhanced.astype(np.float32)
+            return np.zeros(output_shape, dtype=np.float32)
 
         # Fill internal holes (gaps between arms and torso)
         enhanced = self._fill_mask_holes(enhanced)
@@ -892,23 +1740,68 @@ class VideoProcessor:
         # Reduced kernel size significantly to avoid over-expansion
         min_dim = min(frame_shape[:2])
         # Changed from 0.05 to 0.02 (60% reduction) for more conservative closing
-        close_kernel = self._build_ellipse_kernel(min_dim, 0.02, min_size=5, max_size=25)
-        enhanced = cv2.morphologyEx(enhanced, cv2.MORPH_CLOSE, close_kernel)
+        close_size = self._ellipse_kernel_size(
+            min_dim, 0.02,
+            min_size=5 * MASK_GEOMETRY_SCALE,
+            max_size=25 * MASK_GEOMETRY_SCALE
+        )
+        enhanced = self._iter_morph(enhanced, cv2.MORPH_CLOSE, close_size)
 
         # Moderately extend lower body for hands on desk
         enhanced = self._extend_lower_mask(enhanced)
 
-        return enhanced.astype(np.float32)
+        return self._upscale_mask(enhanced, output_shape)
+
+    def _downscale_mask(self, mask, frame_shape):
+        """
+        Shrink a mask by MASK_GEOMETRY_SCALE for the geometry enhancers
+
+        Args:
+            mask: Person mask at frame size
+            frame_shape: Frame dimensions (height, width, channels)
+
+        Returns:
+            tuple: (downscaled mask, its (height, width) as the new frame shape)
+        """
+        if MASK_GEOMETRY_SCALE == 1.0:
+            return mask, frame_shape
+        small = cv2.resize(
+            mask,
+            None,
+            fx=MASK_GEOMETRY_SCALE,
+            fy=MASK_GEOMETRY_SCALE,
+            interpolation=cv2.INTER_NEAREST
+        )
+        return small, small.shape[:2]
+
+    def _upscale_mask(self, mask, shape):
+        """
+        Bring an enhanced mask back to frame size as float32
+
+        Args:
+            mask: Enhanced uint8 mask
+            shape: Target (height, width)
+
+        Returns:
+            numpy.ndarray: float32 mask of the given shape
+        """
+        mask = mask.astype(np.float32)
+        if mask.shape != shape:
+            mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_LINEAR)
+        return mask
 
     def _fill_mask_holes(self, mask):
-        mask_uint8 = (mask > 0).astype(np.uint8) * 255
-        h, w = mask_uint8.shape
-        flood = mask_uint8.copy()
-        fill_mask = np.zeros((h + 2, w + 2), dtype=np.uint8)
-        cv2.floodFill(flood, fill_mask, (0, 0), 255)
-        holes = cv2.bitwise_not(flood)
-        filled = cv2.bitwise_or(mask_uint8, holes)
-        return (filled > 0).astype(np.uint8)
+        # Filling each outer contour fills everything it encloses. Unlike a
+        # flood fill from the corner, background cut off from the corner by a
+        # mask touching the frame edges is not mistaken for a hole.
+        contours, _ = cv2.findContours(
+            (mask > 0).astype(np.uint8),
+            cv2.RETR_EXTERNAL,
+            cv2.CHAIN_APPROX_SIMPLE
+        )
+        filled = np.zeros(mask.shape, dtype=np.uint8)
+        cv2.drawContours(filled, contours, -1, 1, thickness=cv2.FILLED)
+        return filled
 
     def _extend_lower_mask_aggressive(self, mask):
         """
@@ -921,8 +1814,6 @@ class VideoProcessor:
 
         # Process lower 60% of frame
         band_start = int(h * 0.4)
-        lower_band = mask.copy()
-        lower_band[:band_start, :] = 0
 
         # Aggressive kernel sizes (original values)
         kernel_w = int(max(7, min(w - 1 if w > 1 else 1, w * 0.08)))
@@ -933,10 +1824,19 @@ class VideoProcessor:
         if kernel_h % 2 == 0:
             kernel_h = max(3, kernel_h - 1)
 
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, kernel_w), max(3, kernel_h)))
+        kernel = structuring_element(cv2.MORPH_RECT, (max(3, kernel_w), max(3, kernel_h)))
+
+        # Only the band is dilated. The rows the dilation can reach just
+        # above it are included as zeros, instead of copying the whole mask
+        # and blanking its top part.
+        top = max(0, band_start - kernel.shape[0] // 2)
+        lower_band = np.zeros((h - top, w), dtype=mask.dtype)
+        lower_band[band_start - top:] = mask[band_start:]
         extended = cv2.dilate(lower_band, kernel, iterations=1)
 
-        return np.maximum(mask, extended)
+        # Merged in place; callers pass a mask they own
+        cv2.max(mask[top:], extended, dst=mask[top:])
+        return mask
 
     def _extend_lower_mask(self, mask):
         """
@@ -950,8 +1850,6 @@ class VideoProcessor:
 
         # Only process lower 60% of frame (changed from 40% for more conservative approach)
         band_start = int(h * 0.5)
-        lower_band = mask.copy()
-        lower_band[:band_start, :] = 0
 
         # TUNED: Reduced kernel sizes from 0.08/0.04 to 0.04/0.02 (50% reduction)
         kernel_w = int(max(5, min(w - 1 if w > 1 else 1, w * 0.04)))
@@ -962,38 +1860,88 @@ class VideoProcessor:
         if kernel_h % 2 == 0:
             kernel_h = max(3, kernel_h - 1)
 
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, kernel_w), max(3, kernel_h)))
+        kernel = structuring_element(cv2.MORPH_RECT, (max(3, kernel_w), max(3, kernel_h)))
+
+        # Only the band is dilated. The rows the dilation can reach just
+        # above it are included as zeros, instead of copying the whole mask
+        # and blanking its top part.
+        top = max(0, band_start - kernel.shape[0] // 2)
+        lower_band = np.zeros((h - top, w), dtype=mask.dtype)
+        lower_band[band_start - top:] = mask[band_start:]
         extended = cv2.dilate(lower_band, kernel, iterations=1)
 
-        return np.maximum(mask, extended)
+        # Merged in place; callers pass a mask they own
+        cv2.max(mask[top:], extended, dst=mask[top:])
+        return mask
 
-    def _build_ellipse_kernel(self, min_dim, fraction, min_size=9, max_size=61):
+    def _ellipse_kernel_size(self, min_dim, fraction, min_size=9, max_size=61):
         size = int(max(min_size, min(max_size, round(min_dim * fraction))))
         if size % 2 == 0:
             size += 1
-        return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+        return size
+
+    def _iter_morph(self, img, op, size):
+        """
+        Erode, dilate or close with a size x size ellipse.
+
+        Large ellipses are approximated by alternating 3x3 cross and 3x3
+        square passes, which grow an octagon of the same radius. Each pass
+        is a tiny kernel, so this is several times faster than one large
+        non-separable ellipse and stays within a few pixels of its result.
+
+        Args:
+            img: uint8 mask
+            op: cv2.MORPH_ERODE, cv2.MORPH_DILATE or cv2.MORPH_CLOSE
+            size: odd ellipse diameter in pixels
+
+        Returns:
+            Mask after the morphological operation
+        """
+        if size <= 5:
+            kernel = structuring_element(cv2.MORPH_ELLIPSE, (size, size))
+            return cv2.morphologyEx(img, op, kernel)
+
+        if op == cv2.MORPH_CLOSE:
+            img = self._iter_morph(img, cv2.MORPH_DILATE, size)
+            return self._iter_morph(img, cv2.MORPH_ERODE, size)
+
+        step = cv2.dilate if op == cv2.MORPH_DILATE else cv2.erode
+        cross = structuring_element(cv2.MORPH_CROSS, (3, 3))
+        square = structuring_element(cv2.MORPH_RECT, (3, 3))
+        for i in range(size // 2):
+            img = step(img, cross if i % 2 == 0 else square)
+        return img
 
     def _temporal_smooth_mask(self, mask, frame):
-        mask = np.clip(mask, 0, 1).astype(np.float32)
+        # np.clip returns a new array, so the in-place updates below never
+        # touch the caller's mask
+        mask = np.clip(mask, 0, 1).astype(np.float32, copy=False)
         try:
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         except cv2.error:
             return mask
 
+        # Flow is estimated on a downscaled frame; the window shrinks with it
+        # so it covers the same area of the picture
+        scale = TEMPORAL_FLOW_SCALE
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        winsize = max(5, int(23 * scale) | 1)
+
         if (
-            self._prev_mask is not None and
-            self._prev_gray is not None and
-            self._prev_mask.shape == mask.shape and
-            self._prev_gray.shape == gray.shape
+            self._state.prev_mask is not None and
+            self._state.prev_gray is not None and
+            self._state.prev_mask.shape == mask.shape and
+            self._state.prev_gray.shape == gray.shape
         ):
             try:
                 flow = cv2.calcOpticalFlowFarneback(
-                    self._prev_gray,
+                    self._state.prev_gray,
                     gray,
                     None,
                     0.5,
                     1,
-                    23,
+                    winsize,
                     2,
                     7,
                     1.5,
@@ -1001,30 +1949,106 @@ class VideoProcessor:
                 )
 
                 h, w = mask.shape
-                grid_x, grid_y = np.meshgrid(np.arange(w), np.arange(h))
-                map_x = (grid_x + flow[..., 0]).astype(np.float32)
-                map_y = (grid_y + flow[..., 1]).astype(np.float32)
+                if flow.shape[:2] != (h, w):
+                    # Back to mask resolution, with vectors in full-size pixels
+                    flow = cv2.resize(flow, (w, h), interpolation=cv2.INTER_LINEAR)
+                    flow *= 1.0 / scale
+                # Turn the flow into a sampling map in place: remap takes the
+                # (x, y) pairs as one two-channel map
+                flow += pixel_grid(h, w)
                 warped_prev = cv2.remap(
-                    self._prev_mask,
-                    map_x,
-                    map_y,
+                    self._state.prev_mask,
+                    flow,
+                    None,
                     interpolation=cv2.INTER_LINEAR,
                     borderMode=cv2.BORDER_CONSTANT,
                     borderValue=0
                 )
-                mask = np.maximum(mask, warped_prev * 0.8)
-                mask = np.clip(mask, 0, 1)
+                # Both operands are within [0, 1], so no clip is needed
+                warped_prev *= 0.8
+                np.maximum(mask, warped_prev, out=mask)
             except cv2.error as err:
                 logger.debug(f"Optical flow smoothing skipped: {err}")
 
-        self._prev_gray = gray
-        self._prev_mask = mask.copy()
+        # The mask is a fresh array per call and callers only read it (at
+        # most clipping it to [0, 1] in place, which leaves it unchanged),
+        # so it is kept by reference rather than copied
+        self._state.prev_gray = gray
+        self._state.prev_mask = mask
         return mask
 
     def _reset_temporal_state(self):
-        self._prev_mask = None
-        self._prev_gray = None
-        self._missing_person_frames = 0
+        self._state.prev_mask = None
+        self._state.prev_gray = None
+        self._state.missing_person_frames = 0
+        self._state.grabcut_initialized = False
+
+    def combine_person_masks(self, masks, height, width):
+        """
+        Merge YOLO instance masks into one binary person mask
+
+        The reduction, resize and threshold run on the model's device so only
+        the final uint8 mask is copied back to host memory.
+
+        Args:
+            masks: Mask tensor from results[0].masks.data, shape (N, h, w)
+            height: Output mask height
+            width: Output mask width
+
+        Returns:
+            numpy.ndarray: uint8 mask (0 or 255) of shape (height, width)
+        """
+        combined = masks.amax(dim=0).float()
+        combined = F.interpolate(
+            combined[None, None],
+            size=(height, width),
+            mode='bilinear',
+            align_corners=False
+        )[0, 0]
+        return (combined > 0.5).to(torch.uint8).mul_(255).cpu().numpy()
+
+    def merge_person_masks(self, masks, height, width):
+        """
+        Resize YOLO instance masks to frame size and merge them into one soft mask
+
+        Each mask is resized before the per-pixel max, as resizing them one
+        by one with cv2.resize would, but on the model's device; only the
+        merged float32 mask is copied back to host memory.
+
+        Args:
+            masks: Mask tensor from result.masks.data, shape (N, h, w)
+            height: Output mask height
+            width: Output mask width
+
+        Returns:
+            numpy.ndarray: float32 mask in [0, 1] of shape (height, width)
+        """
+        resized = F.interpolate(
+            masks[:, None].float(),
+            size=(height, width),
+            mode='bilinear',
+            align_corners=False
+        )
+        return resized.amax(dim=0)[0].cpu().numpy()
+
+    def _scratch_buffer(self, name, shape, dtype=np.uint8):
+        """
+        Return a reusable buffer owned by the calling thread
+
+        Args:
+            name: Buffer name
+            shape: Required shape
+            dtype: Required dtype
+
+        Returns:
+            numpy.ndarray: Uninitialized buffer of the given shape and dtype
+        """
+        buffers = self._scratch.__dict__
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            buffers[name] = buffer
+        return buffer
 
     def _apply_filter(self, frame, filter_type):
         """
@@ -1037,28 +2061,18 @@ class VideoProcessor:
         Returns:
             numpy.ndarray: Filtered frame
         """
-        if filter_type == 'grayscale':
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        return apply_filter(frame, filter_type)
 
-        elif filter_type == 'blur':
-            return cv2.GaussianBlur(frame, (21, 21), 0)
-
-        elif filter_type == 'sepia':
-            # Sepia filter matrix
-            kernel = np.array([[0.272, 0.534, 0.131],
-                             [0.349, 0.686, 0.168],
-                             [0.393, 0.769, 0.189]])
-            sepia = cv2.transform(frame, kernel)
-            sepia = np.clip(sepia, 0, 255).astype(np.uint8)
-            return sepia
+    def _get_device(self):
+        """
+        Return the inference device detected when the processor was created
 
-        else:
-            # Unknown filter type, return original
-            logger.warning(f"Unknown filter type: {filter_type}, returning original frame")
-            return frame
+        Returns:
+            str: Device identifier ('cuda', 'mps', or 'cpu')
+        """
+        return self._device
 
-    def _get_device(self):
+    def _detect_device(self):
         """
         Determine the best available device for inference
         Priority: CUDA (NVIDIA) > MPS (Apple Silicon) > CPU
@@ -1066,37 +2080,24 @@ class VideoProcessor:
         Returns:
             str: Device identifier ('cuda', 'mps', or 'cpu')
         """
-        try:
-            import torch
-
-            # Check for NVIDIA CUDA
-            if torch.cuda.is_available():
-                return 'cuda'
+        # Check for NVIDIA CUDA
+        if CUDA_AVAILABLE:
+            return 'cuda'
 
-            # Check for Apple Silicon MPS
-            if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-                return 'mps'
+        # Check for Apple Silicon MPS
+        if MPS_AVAILABLE:
+            return 'mps'
 
-            # Fallback to CPU
-            return 'cpu'
-        except:
-            return 'cpu'
+        # Fallback to CPU
+        return 'cpu'
 
     def _is_cuda_available(self):
         """Check if CUDA is available for GPU acceleration"""
-        try:
-            import torch
-            return torch.cuda.is_available()
-        except:
-            return False
+        return CUDA_AVAILABLE
 
     def _is_mps_available(self):
         """Check if MPS (Apple Silicon) is available for GPU acceleration"""
-        try:
-            import torch
-            return hasattr(torch.backends, 'mps') and torch.backends.mps.is_available()
-        except:
-            return False
+        return MPS_AVAILABLE
 
     def get_model_info(self):
         """Get information about the loaded model"""
@@ -1114,163 +2115,87 @@ class VideoProcessor:
         """Get human-readable device name"""
         if device == 'cuda':
             try:
-                import torch
                 return f"NVIDIA GPU ({torch.cuda.get_device_name(0)})"
-            except:
+            except (RuntimeError, AssertionError):
                 return "NVIDIA GPU"
         elif device == 'mps':
             return "Apple Silicon GPU (Metal)"
         else:
             return "CPU"
 
-    def _reencode_with_audio(self, input_video_path, output_video_path):
-        """
-        Re-encode processed video with audio from original video
-        Uses H.264 codec with web-optimized settings
-
-        Args:
-            input_video_path: Path to original video (with audio)
-            output_video_path: Path to processed video (without audio)
-        """
-        # Check if ffmpeg is available
-        if not shutil.which('ffmpeg'):
-            logger.warning("ffmpeg not found in PATH, skipping re-encoding")
-            return
-
-        logger.info(f"Re-encoding video with audio from original: {output_video_path}")
-
-        # Create temporary output path
-        temp_path = output_video_path.replace('.mp4', '_temp.mp4')
-
-        try:
-            # FFmpeg command to combine processed video with original audio
-            cmd = [
-                'ffmpeg',
-                '-i', output_video_path,      # Processed video (no audio)
-                '-i', input_video_path,       # Original video (with audio)
-                '-c:v', 'libx264',            # H.264 video codec
-                '-preset', 'medium',           # Encoding speed/quality tradeoff
-                '-crf', '23',                  # Quality (lower = better, 18-28 is good range)
-                '-pix_fmt', 'yuv420p',         # Pixel format for compatibility
-                '-c:a', 'aac',                 # AAC audio codec (browser compatible)
-                '-b:a', '192k',                # Audio bitrate
-                '-map', '0:v:0',               # Take video from first input (processed)
-                '-map', '1:a:0?',              # Take audio from second input (original), if exists
-                '-movflags', '+faststart',     # Enable streaming (moov atom at start)
-                '-shortest',                   # Match shortest stream duration
-                '-y',                          # Overwrite output file
-                temp_path
-            ]
-
-            # Run ffmpeg
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=300  # 5 minute timeout
-            )
 
-            if result.returncode == 0:
-                # Replace original with re-encoded version
-                shutil.move(temp_path, output_video_path)
-                logger.info("Video successfully re-encoded with audio")
-            else:
-                logger.error(f"FFmpeg re-encoding failed: {result.stderr.decode()}")
-                # Clean up temp file if it exists
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-
-        except subprocess.TimeoutExpired:
-            logger.error("FFmpeg re-encoding timed out")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except Exception as e:
-            logger.error(f"FFmpeg re-encoding error: {e}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+# YOLO model pools keyed by (model_path, imgsz, half); shared by processors
+_model_pools = {}
+_model_pool_lock = threading.Lock()
 
-    def _reencode_with_ffmpeg(self, video_path):
-        """
-        Re-encode video with ffmpeg to ensure browser compatibility
-        Uses H.264 codec with web-optimized settings
 
-        Args:
-            video_path: Path to video file to re-encode
-        """
-        # Check if ffmpeg is available
-        if not shutil.which('ffmpeg'):
-            logger.warning("ffmpeg not found in PATH, skipping re-encoding")
-            return
-
-        logger.info(f"Re-encoding video with ffmpeg for browser compatibility: {video_path}")
+def get_model_pool(model_path, device, max_size, imgsz=None, half=False, compile_model=False):
+    """
+    Get or create the shared YOLO model pool for a weights file
 
-        # Create temporary output path
-        temp_path = video_path.replace('.mp4', '_temp.mp4')
+    Processors with and without SAM use the same YOLO models, so they share
+    one pool. The first caller's size limit applies.
 
-        try:
-            # FFmpeg command for browser-compatible H.264 encoding
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,
-                '-c:v', 'libx264',           # H.264 video codec
-                '-preset', 'medium',          # Encoding speed/quality tradeoff
-                '-crf', '23',                 # Quality (lower = better, 18-28 is good range)
-                '-pix_fmt', 'yuv420p',        # Pixel format for compatibility
-                '-movflags', '+faststart',    # Enable streaming (moov atom at start)
-                '-y',                         # Overwrite output file
-                temp_path
-            ]
+    Args:
+        model_path: Path to YOLOv11 model weights
+        device: Inference device ('cuda', 'mps' or 'cpu')
+        max_size: Most models the pool will load
+        imgsz: Input size the models are warmed up at
+        half: Warm models up in FP16
+        compile_model: torch.compile models on CUDA
 
-            # Run ffmpeg
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=300  # 5 minute timeout
+    Returns:
+        YOLOModelPool: Shared pool
+    """
+    key = (str(model_path), imgsz, half)
+    with _model_pool_lock:
+        if key not in _model_pools:
+            _model_pools[key] = YOLOModelPool(
+                model_path,
+                device,
+                max_size,
+                imgsz=imgsz,
+                half=half,
+                compile_model=compile_model
             )
+        return _model_pools[key]
 
-            if result.returncode == 0:
-                # Replace original with re-encoded version
-                shutil.move(temp_path, video_path)
-                logger.info("Video successfully re-encoded with ffmpeg")
-            else:
-                logger.error(f"FFmpeg re-encoding failed: {result.stderr.decode()}")
-                # Clean up temp file if it exists
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-
-        except subprocess.TimeoutExpired:
-            logger.error("FFmpeg re-encoding timed out")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except Exception as e:
-            logger.error(f"FFmpeg re-encoding error: {e}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
 
+# Processor instances keyed by (model_path, use_sam, sam_model_type)
+_processor_instances = {}
+_processor_lock = threading.Lock()
 
-# Singleton instance
-_processor_instance = None
 
-
-def get_video_processor(model_path='yolo11n-seg.pt', use_sam=False, sam_model_type='vit_b'):
+def get_video_processor(model_path='yolo11n-seg.pt', use_sam=False, sam_model_type='vit_b',
+                        model_pool_size=1):
     """
-    Get or create a singleton video processor instance
+    Get or create a cached video processor instance
+
+    One instance is kept per configuration. Instances with the same model_path
+    share one YOLO model pool, so the SAM predictor is the only thing the SAM
+    and YOLO-only processors load separately.
 
     Args:
         model_path: Path to YOLOv11 model weights
         use_sam: Enable SAM refinement for pixel-perfect boundaries
         sam_model_type: SAM model type ('vit_b', 'vit_l', 'vit_h')
+        model_pool_size: Maximum YOLO models in the shared pool
 
     Returns:
-        VideoProcessor: Singleton processor instance
+        VideoProcessor: Cached processor instance
     """
-    global _processor_instance
-    # Recreate instance if SAM settings changed
-    if _processor_instance is None or (_processor_instance.use_sam != use_sam):
-        _processor_instance = VideoProcessor(
-            model_path=model_path,
-            use_sam=use_sam,
-            sam_model_type=sam_model_type
-        )
-    return _processor_instance
+    key = (model_path, use_sam, sam_model_type)
+    with _processor_lock:
+        if key not in _processor_instances:
+            logger.info(f"Initializing video processor with use_sam={use_sam}...")
+            _processor_instances[key] = VideoProcessor(
+                model_path=model_path,
+                use_sam=use_sam,
+                sam_model_type=sam_model_type,
+                model_pool_size=model_pool_size
+            )
+            if use_sam:
+                logger.info("Video processor initialized with SAM refinement")
+            else:
+                logger.info("Video processor initialized (YOLO-only mode)")
+        return _processor_instances[key]
@@ -33,9 +33,10 @@ function App() {
     fps: number;
     eta_seconds: number;
     preview_url?: string;
+    preview_data_url?: string;
   } | null>(null);
   const eventSourceRef = useRef<EventSource | null>(null);
-  const [previewTimestamp, setPreviewTimestamp] = useState<number>(Date.now());
+  const [previewSrc, setPreviewSrc] = useState<string | null>(null);
   const [isPreviewLoading, setIsPreviewLoading] = useState(false);
 
   // Filter state
@@ -48,7 +49,7 @@ function App() {
   const [filterPreviews, setFilterPreviews] = useState<Array<{
     filter_id: string;
     filter_name: string;
-    preview_url: string;
+    preview_data_url: string;
     error?: string;
   }>>([]);
   const [isLoadingPreviews, setIsLoadingPreviews] = useState(false);
@@ -207,6 +208,7 @@ function App() {
     setProcessingStatus('processing');
     setProcessingError('');
     setProgressData(null);
+    setPreviewSrc(null);
 
     try {
       // Start the processing job with the selected filter type
@@ -233,9 +235,13 @@ function App() {
         // onProgress
         (data) => {
           setProgressData(data);
-          if (data.preview_url) {
+          // Previews arrive inline over SSE; the file URL is a fallback
+          if (data.preview_data_url) {
             setIsPreviewLoading(true);
-            setPreviewTimestamp(Date.now());
+            setPreviewSrc(data.preview_data_url);
+          } else if (data.preview_url) {
+            setIsPreviewLoading(true);
+            setPreviewSrc(`http://127.0.0.1:8080${data.preview_url}?t=${Date.now()}`);
           }
         },
         // onStatus
@@ -517,7 +523,7 @@ function App() {
                                       </div>
                                     ) : (
                                       <img
-                                        src={`http://127.0.0.1:8080${preview.preview_url}`}
+                                        src={preview.preview_data_url}
                                         alt={preview.filter_name}
                                         className="w-full h-full object-cover"
                                       />
@@ -590,10 +596,10 @@ function App() {
                                 </div>
                               </div>
                               <div className="relative w-full aspect-video bg-black rounded-lg overflow-hidden">
-                                {progressData?.preview_url ? (
+                                {previewSrc ? (
                                   <>
                                     <img
-                                      src={`http://127.0.0.1:8080${progressData.preview_url}?t=${previewTimestamp}`}
+                                      src={previewSrc}
                                       alt="Processing preview"
                                       className="w-full h-full object-contain"
                                       onLoad={() => setIsPreviewLoading(false)}
@@ -713,7 +719,7 @@ function App() {
                                     </div>
                                   ) : (
                                     <img
-                                      src={`http://127.0.0.1:8080${preview.preview_url}`}
+                                      src={preview.preview_data_url}
                                       alt={preview.filter_name}
                                       className="w-full h-full object-cover"
                                     />
@@ -293,6 +293,7 @@ export async function applySelectiveFilter(
 
 /**
  * Process video with AI-powered person detection and selective filtering
+ * Queues a background job and resolves with its job_id - poll getJobStatus for the result
  */
 export async function processVideoWithAI(
   videoId: string,
@@ -571,7 +572,7 @@ export async function extractFilterPreviews(
   previews: Array<{
     filter_id: string;
     filter_name: string;
-    preview_url: string;
+    preview_data_url: string;
     error?: string;
   }>;
   frame_size: {